@@ -1,17 +1,450 @@
+import time  # Start-up phase timing
+STARTUP_STARTED = time.perf_counter()
 import os
+import sys
 import json
-import shutil  # For copying and moving files
-import datetime  # For timestamps in the header
+import hashlib  # For thumbnail file names in the icon cache
+from collections import OrderedDict  # LRU ordering for the icon cache
 import tkinter as tk
 from tkinter import ttk, messagebox, Scrollbar, Canvas
-from PIL import Image, ImageTk
+from campfire_core import CampfireEngine, ENVIRONMENTS, STATE_DIR, drift_status, write_json_atomic
+# PIL is imported by IconCache the first time an icon thumbnail has to be built.
+STARTUP_IMPORTED = time.perf_counter()
 
-PUSH_REQUESTS_FILE = 'push_requests.json'
+SEARCH_INLINE_LIMIT = 5000  # Environments with more sub-applications are first indexed in the background
+
+class StartupReport:
+    """Durations of the launcher's start-up phases, from module import to the first drawn window."""
+    
+    def __init__(self, started=STARTUP_STARTED):
+        self.started = started
+        self.last = started
+        self.phases = []  # [(phase, seconds), ...]
+    
+    def mark(self, phase, now=None):
+        """Close the phase that began at the previous mark."""
+        now = time.perf_counter() if now is None else now
+        self.phases.append((phase, now - self.last))
+        self.last = now
+    
+    def total(self):
+        return self.last - self.started
+    
+    def summary(self, target_ms=None):
+        parts = [f"{phase} {seconds * 1000:.1f} ms" for phase, seconds in self.phases]
+        text = f"Campfire start-up: {', '.join(parts)}; time to first window {self.total() * 1000:.1f} ms"
+        if target_ms:
+            text += f" (target {target_ms} ms: {'OK' if self.total() * 1000 <= target_ms else 'EXCEEDED'})"
+        return text
+    
+    def save(self, path=os.path.join(STATE_DIR, "startup.json")):
+        write_json_atomic(path, {
+            "phases_ms": {phase: round(seconds * 1000, 3) for phase, seconds in self.phases},
+            "total_ms": round(self.total() * 1000, 3),
+        })
+
+class IconCache:
+    """
+    Bounded LRU of Tk images keyed by (icon path, mtime).
+    Resized thumbnails are kept on disk under the state directory, so an icon is decoded and
+    resized by PIL only once; later loads read the pre-sized PNG straight into Tk.
+    """
+    
+    def __init__(self, size=(32, 32), max_entries=256, thumb_dir=os.path.join(STATE_DIR, "icons")):
+        self.size = size
+        self.max_entries = max_entries
+        self.thumb_dir = thumb_dir
+        self._images = OrderedDict()
+        self._placeholder = None
+    
+    def _thumbnail_path(self, icon_path, mtime):
+        key = f"{os.path.abspath(icon_path)}|{mtime}|{self.size[0]}x{self.size[1]}"
+        return os.path.join(self.thumb_dir, hashlib.sha1(key.encode()).hexdigest() + ".png")
+    
+    def _build_thumbnail(self, icon_path, thumb_path):
+        from PIL import Image
+        os.makedirs(self.thumb_dir, exist_ok=True)
+        tmp_path = f"{thumb_path}.tmp{os.getpid()}"
+        Image.open(icon_path).convert("RGBA").resize(self.size).save(tmp_path, "PNG")
+        os.replace(tmp_path, thumb_path)
+    
+    def get(self, icon_path, mtime=None):
+        """Return a Tk image for icon_path, or None if the icon does not exist or cannot be read."""
+        if mtime is None:
+            try:
+                mtime = os.stat(icon_path).st_mtime_ns
+            except FileNotFoundError:
+                return None
+        key = (icon_path, mtime)
+        if key in self._images:
+            self._images.move_to_end(key)
+            return self._images[key]
+        
+        thumb_path = self._thumbnail_path(icon_path, mtime)
+        try:
+            if not os.path.exists(thumb_path):
+                self._build_thumbnail(icon_path, thumb_path)
+            image = tk.PhotoImage(file=thumb_path)
+        except (ImportError, OSError, tk.TclError):
+            return None
+        self._images[key] = image
+        if len(self._images) > self.max_entries:
+            self._images.popitem(last=False)
+        return image
+    
+    def placeholder(self):
+        """A plain gray square used when no icon is available."""
+        if self._placeholder is None:
+            self._placeholder = tk.PhotoImage(width=self.size[0], height=self.size[1])
+            self._placeholder.put("gray", to=(0, 0, self.size[0], self.size[1]))
+        return self._placeholder
+
+class VirtualSubappList:
+    """
+    Scrollable list of sub-application rows that only creates widgets for the visible viewport.
+    Rows have a fixed height and are recycled while scrolling: the canvas scrolls over a virtual
+    region sized for every item, and the small pool of row windows is moved and re-labelled to
+    whichever items are currently in view.
+    """
+    
+    def __init__(self, parent, names, actions, get_icon=None, get_path=None, row_height=64, selectable=False):
+        self.names = list(names)
+        self.actions = actions    # [(button text, callback(name)), ...] packed right to left
+        self.get_icon = get_icon  # callback(name) -> image, or None for rows without icons
+        self.get_path = get_path or (lambda name: f"{name}.py")  # callback(name) -> path shown under the name
+        self.row_height = row_height
+        self.selectable = selectable
+        self.selected = set()     # Kept by name so selection survives row recycling
+        self.rows = []            # Recycled row widgets, each bound to at most one name
+        
+        self.frame = ttk.Frame(parent)
+        self.canvas = Canvas(self.frame, highlightthickness=0)
+        self.scrollbar = Scrollbar(self.frame, orient=tk.VERTICAL, command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self._on_scroll, yscrollincrement=row_height)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.bind("<Configure>", lambda e: self._layout())
+        self._update_scrollregion()
+    
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+    
+    def set_names(self, names):
+        """Replace the listed names, keeping the scroll position where possible."""
+        self.names = list(names)
+        self.selected &= set(self.names)
+        self._update_scrollregion()
+        self._layout()
+    
+    def update_names(self, names):
+        """Patch the list to names; rows still showing the same item are left alone."""
+        if names != self.names:
+            self.set_names(names)
+    
+    def selected_names(self):
+        return [name for name in self.names if name in self.selected]
+    
+    def select_all(self, selected=True):
+        self.selected = set(self.names) if selected else set()
+        for row in self.rows:
+            if row["name"] is not None:
+                row["check_var"].set(row["name"] in self.selected)
+    
+    def _toggle(self, row):
+        if row["check_var"].get():
+            self.selected.add(row["name"])
+        else:
+            self.selected.discard(row["name"])
+    
+    def _update_scrollregion(self):
+        self.canvas.configure(scrollregion=(0, 0, 1, len(self.names) * self.row_height))
+    
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self._layout()
+    
+    def _create_row(self):
+        frame = ttk.Frame(self.canvas, padding=(10, 5))
+        row = {"frame": frame, "name": None, "buttons": []}
+        if self.selectable:
+            row["check_var"] = tk.BooleanVar(value=False)
+            ttk.Checkbutton(frame, variable=row["check_var"], command=lambda: self._toggle(row)).pack(side=tk.LEFT)
+        if self.get_icon:
+            row["icon"] = tk.Label(frame)
+            row["icon"].pack(side=tk.LEFT, padx=5)
+        details = ttk.Frame(frame)
+        details.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        row["name_label"] = tk.Label(details)
+        row["name_label"].pack(anchor=tk.W)
+        row["file_label"] = tk.Label(details)
+        row["file_label"].pack(anchor=tk.W)
+        for text, _ in self.actions:
+            button = ttk.Button(frame, text=text)
+            button.pack(side=tk.RIGHT)
+            row["buttons"].append(button)
+        row["window"] = self.canvas.create_window(0, 0, window=frame, anchor="nw",
+                                                  width=self.canvas.winfo_width(), height=self.row_height)
+        return row
+    
+    def _bind_row(self, row, name):
+        if row["name"] == name:
+            return
+        row["name"] = name
+        if self.selectable:
+            row["check_var"].set(name in self.selected)
+        if self.get_icon:
+            icon = self.get_icon(name)
+            row["icon"].configure(image=icon)
+            row["icon"].image = icon
+        row["name_label"].configure(text=f"Name: {name}")
+        row["file_label"].configure(text=f"Filename: {self.get_path(name)}")
+        for button, (_, callback) in zip(row["buttons"], self.actions):
+            button.configure(command=lambda n=name, cb=callback: cb(n))
+    
+    def _layout(self):
+        """Position the recycled rows over the items currently inside the viewport."""
+        height = max(self.canvas.winfo_height(), self.row_height)
+        first = max(0, int(self.canvas.canvasy(0)) // self.row_height)
+        needed = min(height // self.row_height + 2, len(self.names))
+        while len(self.rows) < needed:
+            self.rows.append(self._create_row())
+        
+        width = self.canvas.winfo_width()
+        for slot, row in enumerate(self.rows):
+            index = first + slot
+            if index < len(self.names):
+                self._bind_row(row, self.names[index])
+                self.canvas.coords(row["window"], 0, index * self.row_height)
+                self.canvas.itemconfigure(row["window"], width=width, state="normal")
+            else:
+                row["name"] = None
+                self.canvas.itemconfigure(row["window"], state="hidden")
+
+class Screen:
+    """A built screen: its frame, its sub-application list if any, and the hook that patches it."""
+    
+    def __init__(self, frame):
+        self.frame = frame
+        self.subapp_list = None
+        self.on_show = None  # callback() bringing the screen up to date when it is shown again
+
+class ScreenManager:
+    """
+    Keeps built screens alive, one frame per screen key, and swaps frames instead of destroying and
+    rebuilding widgets. Showing a screen again runs its on_show hook, which patches only what changed
+    since it was last shown (usually nothing), so navigating does not slow down with the number of
+    sub-applications.
+    """
+    
+    def __init__(self, root):
+        self.root = root
+        self.screens = {}  # key -> Screen
+        self.current = None
+    
+    def show(self, key, build):
+        """Show the screen for key, building it with build(screen) the first time."""
+        screen = self.screens.get(key)
+        if screen is None:
+            screen = self.screens[key] = Screen(tk.Frame(self.root))
+            try:
+                build(screen)
+            except Exception:
+                self.discard(key)
+                raise
+        elif screen.on_show is not None:
+            screen.on_show()  # Patched while still hidden
+        if screen is not self.current:
+            if self.current is not None:
+                self.current.frame.pack_forget()
+            screen.frame.pack(fill=tk.BOTH, expand=True)
+            self.current = screen
+        return screen
+    
+    def refresh(self):
+        """Patch the screen being shown, e.g. after a background operation changed what it lists."""
+        if self.current is not None and self.current.on_show is not None:
+            self.current.on_show()
+    
+    def discard(self, key):
+        """Destroy one cached screen; it is built again the next time it is shown."""
+        screen = self.screens.pop(key, None)
+        if screen is not None:
+            if screen is self.current:
+                self.current = None
+            screen.frame.destroy()
+    
+    def clear(self):
+        """Destroy every cached screen, e.g. when a user logs in with a different role."""
+        for key in list(self.screens):
+            self.discard(key)
+
+def format_seconds(seconds):
+    return "-" if seconds is None else f"{seconds:.2f} s"
+
+def format_megabytes(size):
+    return "-" if size is None else f"{size / (1024 * 1024):.1f} MB"
+
+class RunPanel:
+    """Window listing sub-application runs with their live output and a Cancel button."""
+    
+    def __init__(self, root, runner):
+        self.runner = runner
+        self.window = tk.Toplevel(root)
+        self.window.title("Campfire 1.0 - Runs")
+        
+        self.tree = ttk.Treeview(self.window, columns=("environment", "name", "status", "time"), show="headings",
+                                 height=6)
+        for column, width in (("environment", 80), ("name", 200), ("status", 120), ("time", 80)):
+            self.tree.heading(column, text=column.title())
+            self.tree.column(column, width=width)
+        self.tree.pack(fill=tk.X, padx=5, pady=5)
+        self.tree.bind("<<TreeviewSelect>>", lambda e: self.show_output())
+        
+        ttk.Button(self.window, text="Cancel Selected Run", command=self.cancel_selected).pack(pady=5)
+        self.output = tk.Text(self.window, height=20, width=90, state=tk.DISABLED)
+        self.output.tag_configure("stderr", foreground="red")
+        self.output.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        for run in runner.runs.values():
+            self.update_run(run)
+    
+    def exists(self):
+        return bool(self.window.winfo_exists())
+    
+    def selected_run(self):
+        selection = self.tree.selection()
+        return self.runner.runs.get(int(selection[0])) if selection else None
+    
+    def update_run(self, run):
+        iid = str(run.run_id)
+        values = (run.environment, run.name, run.status, format_seconds(run.wall_seconds))
+        if self.tree.exists(iid):
+            self.tree.item(iid, values=values)
+        else:
+            self.tree.insert("", tk.END, iid=iid, values=values)
+            self.tree.selection_set(iid)
+    
+    def append_output(self, run, stream_name, text):
+        if self.selected_run() is run:
+            self.output.configure(state=tk.NORMAL)
+            self.output.insert(tk.END, text, stream_name)
+            self.output.see(tk.END)
+            self.output.configure(state=tk.DISABLED)
+    
+    def show_output(self):
+        run = self.selected_run()
+        self.output.configure(state=tk.NORMAL)
+        self.output.delete("1.0", tk.END)
+        if run:
+            for stream_name, text in run.output:
+                self.output.insert(tk.END, text, stream_name)
+            self.output.see(tk.END)
+        self.output.configure(state=tk.DISABLED)
+    
+    def cancel_selected(self):
+        run = self.selected_run()
+        if run:
+            self.runner.cancel(run.run_id)
+
+class BackgroundTasks:
+    """
+    Runs file operations (push, approve, remove) off the Tk thread, one at a time in the order they
+    were started; each operation still spreads its copies over the engine's copy pool. Progress and
+    results come back through a queue that root.after callbacks drain on the Tk thread.
+    """
+    
+    def __init__(self, root, poll_ms=100):
+        import queue
+        from concurrent.futures import ThreadPoolExecutor
+        self.root = root
+        self.poll_ms = poll_ms
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.events = queue.Queue()
+        self.pending = 0  # Submitted operations that have not reported back yet
+    
+    def submit(self, operation, on_done, on_error, on_progress):
+        """
+        Run operation(progress) in the background. on_progress(done, total) is called with total None
+        when it starts; on_done(result) or on_error(exception) when it ends. All callbacks run on the Tk thread.
+        """
+        def progress(done, total):
+            self.events.put((on_progress, (done, total), False))
+        
+        def task():
+            progress(0, None)
+            try:
+                self.events.put((on_done, (operation(progress),), True))
+            except Exception as e:
+                self.events.put((on_error, (e,), True))
+        
+        if self.pending == 0:
+            self.root.after(self.poll_ms, self.poll)
+        self.pending += 1
+        self.executor.submit(task)
+    
+    def poll(self):
+        while not self.events.empty():  # Only the Tk thread consumes
+            callback, args, finished = self.events.get_nowait()
+            if finished:
+                self.pending -= 1
+            callback(*args)
+        if self.pending:
+            self.root.after(self.poll_ms, self.poll)
+    
+    def shutdown(self):
+        """Drop queued operations; the one already running finishes before the process exits."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+class NotificationArea:
+    """
+    Strip at the bottom of the window for progress and results, in place of modal message boxes.
+    Messages disappear after a few seconds; errors stay until clicked.
+    """
+    
+    COLORS = {"info": "black", "success": "dark green", "error": "red"}
+    
+    def __init__(self, root, max_messages=5, timeout_ms=8000):
+        self.frame = tk.Frame(root)
+        self.frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.progress = tk.Label(self.frame, anchor=tk.W, fg="gray30")
+        self.messages = []
+        self.max_messages = max_messages
+        self.timeout_ms = timeout_ms
+    
+    def show(self, text, level="info"):
+        label = tk.Label(self.frame, text=text, anchor=tk.W, fg=self.COLORS[level], cursor="hand2")
+        label.pack(fill=tk.X, padx=5)
+        label.bind("<Button-1>", lambda e: self.dismiss(label))
+        self.messages.append(label)
+        if len(self.messages) > self.max_messages:
+            self.dismiss(self.messages[0])
+        if level != "error":
+            self.frame.after(self.timeout_ms, lambda: self.dismiss(label))
+    
+    def dismiss(self, label):
+        if label in self.messages:
+            self.messages.remove(label)
+            label.destroy()
+    
+    def set_progress(self, text=None):
+        """Show the running operation's progress above the messages, or hide it with None."""
+        if text is None:
+            self.progress.pack_forget()
+            return
+        self.progress.configure(text=text)
+        if not self.progress.winfo_manager():
+            if self.messages:
+                self.progress.pack(fill=tk.X, padx=5, before=self.messages[0])
+            else:
+                self.progress.pack(fill=tk.X, padx=5)
 
 class CampfireApp:
-    def __init__(self):
+    def __init__(self, startup_report=False, mainloop=True):
+        self.startup = StartupReport()
+        self.startup.mark("imports", STARTUP_IMPORTED)
         self.root = tk.Tk()
         self.root.title("Campfire 1.0")
+        self.startup.mark("tk")
         
         # User role and level will be set at login.
         self.user_role = None    # "programmer_manager", "programmer", "user_manager", "user"
@@ -20,35 +453,94 @@ class CampfireApp:
         # Current environment (DEV, TEST, PROD) is set later.
         self.environment = None
         
-        # Ensure necessary directories exist.
-        self.ensure_directories_exist(["DEV", "TEST", "PROD"])
+        # Catalogs, promotion, the push request queue and runs are handled by the headless engine.
+        # Its stores and catalogs open on the first screen that needs them unless lazy_start is off.
+        self.engine = CampfireEngine()
+        self.startup_report = startup_report or self.engine.config.get("startup_report", False)
+        
+        # Shared icon cache for every sub-application list.
+        self.icon_cache = IconCache()
+        
+        # Sub-applications run out of process; the runner and Runs panel are created on first use.
+        self.runner = None
+        self.run_panel = None
+        self.root.protocol("WM_DELETE_WINDOW", self.quit)
         
-        # Load any existing push requests.
-        self.push_requests = self.load_push_requests()
+        # Push, approve and remove run in the background and report in the notification area.
+        self.tasks = None
+        self.notifications = NotificationArea(self.root)
+        self.indexed_environments = set()  # Environments whose search index has been built
         
-        # Load subapplications (if needed).
-        self.subapplications = self.load_subapplications()
+        # Screens are built once and kept; navigating swaps them and patches what changed.
+        self.screens = ScreenManager(self.root)
+        
+        # subapplications.json is loaded on first access.
+        self._subapplications = None
+        
+        if not self.engine.config.get("lazy_start", True):
+            self.engine.preload()
+            self.subapplications
+        self.startup.mark("engine")
         
         # Start at the login screen.
         self.login_screen()
-        self.root.mainloop()
+        self.startup.mark("login screen")
+        self.root.after_idle(self.finish_startup)
+        if mainloop:  # Benchmarks build the app without entering the event loop
+            self.root.mainloop()
     
     ### Utility Functions ###
     
-    def ensure_directories_exist(self, directories):
-        for directory in directories:
-            if not os.path.exists(directory):
-                os.makedirs(directory)
+    @property
+    def subapp_list(self):
+        """The sub-application list of the screen being shown, used by its bulk action buttons."""
+        return self.screens.current.subapp_list
     
-    def load_push_requests(self):
-        if os.path.exists(PUSH_REQUESTS_FILE):
-            with open(PUSH_REQUESTS_FILE, 'r') as f:
-                return json.load(f)
-        return []
+    def quit(self):
+        if self.runner is not None:
+            self.runner.shutdown()
+        if self.tasks is not None:
+            self.tasks.shutdown()
+        self.root.destroy()
+    
+    def get_tasks(self):
+        if self.tasks is None:
+            self.tasks = BackgroundTasks(self.root)
+        return self.tasks
+    
+    def start_operation(self, description, operation, on_done, error_text):
+        """
+        Run operation(progress) in the background, showing its progress in the notification area.
+        on_done(result) runs on the Tk thread; a failure is shown as error_text with the exception.
+        Afterwards the screen being shown, whichever it is by then, is patched to match.
+        """
+        def on_progress(done, total):
+            self.notifications.set_progress(f"{description}..." if total is None else f"{description}: {done}/{total}")
+        
+        def finish(show_result, result):
+            if self.tasks.pending == 0:
+                self.notifications.set_progress(None)
+            show_result(result)
+            self.screens.refresh()
+        
+        def on_error(error):
+            self.notifications.show(f"{error_text}: {error}", "error")
+        
+        self.get_tasks().submit(operation, lambda result: finish(on_done, result),
+                                lambda error: finish(on_error, error), on_progress)
+    
+    def finish_startup(self):
+        """Runs once the first window has been drawn; reports start-up phases if asked to."""
+        self.startup.mark("first window")
+        if self.startup_report:
+            print(self.startup.summary(self.engine.config.get("startup_target_ms")))
+            self.startup.save()
     
-    def save_push_requests(self):
-        with open(PUSH_REQUESTS_FILE, 'w') as f:
-            json.dump(self.push_requests, f)
+    @property
+    def subapplications(self):
+        if self._subapplications is None:
+            self._subapplications = self.load_subapplications()
+        return self._subapplications
     
     def load_subapplications(self):
         if os.path.exists('subapplications.json'):
@@ -61,29 +553,33 @@ class CampfireApp:
             json.dump(self.subapplications, f)
     
     def get_subapplications_from_directory(self, directory):
-        try:
-            return [os.path.splitext(file)[0] for file in os.listdir(directory) if file.endswith(".py")]
-        except FileNotFoundError:
-            return []
-    
-    def get_icon_for_subapp(self, subapp_name):
-        icon_path = "default_icon.png"
-        if os.path.exists(icon_path):
-            image = Image.open(icon_path).resize((32, 32))
-            return ImageTk.PhotoImage(image)
-        else:
-            image = Image.new("RGB", (32, 32), "gray")
-            return ImageTk.PhotoImage(image)
+        return self.engine.list_subapplications(directory)
+    
+    def get_icon_for_subapp(self, subapp_name, directory=None):
+        """Use <name>.png next to the sub-application if present, else default_icon.png, else a gray square."""
+        own_icon = self.engine.get_catalog(directory or self.environment).icon_for(subapp_name)
+        if own_icon:
+            icon = self.icon_cache.get(*own_icon)
+            if icon is not None:
+                return icon
+        icon = self.icon_cache.get("default_icon.png")
+        return icon if icon is not None else self.icon_cache.placeholder()
+    
+    def get_path_for_subapp(self, subapp_name, directory=None):
+        """Where the sub-application lives: <name>.py, <name>.pyz or its <name> package directory."""
+        # No refresh here, as rows are rebound while scrolling: the list's names source refreshed the catalog.
+        return self.engine.subapp_path(directory or self.environment, subapp_name)
     
     ### Menu Hierarchy ###
     
     def login_screen(self):
         """Display the login screen."""
-        for widget in self.root.winfo_children():
-            widget.destroy()
-        
-        tk.Label(self.root, text="Login", font=("Arial", 16)).pack(pady=10)
-        tk.Label(self.root, text="Select your user role:", font=("Arial", 12)).pack(pady=5)
+        self.screens.show("login", self.build_login_screen)
+    
+    def build_login_screen(self, screen):
+        frame = screen.frame
+        tk.Label(frame, text="Login", font=("Arial", 16)).pack(pady=10)
+        tk.Label(frame, text="Select your user role:", font=("Arial", 12)).pack(pady=5)
         
         self.role_var = tk.StringVar(value="user")
         roles = [
@@ -93,9 +589,9 @@ class CampfireApp:
             ("User (Level 1)", "user")
         ]
         for text, role in roles:
-            tk.Radiobutton(self.root, text=text, variable=self.role_var, value=role).pack(anchor=tk.W, padx=20)
+            tk.Radiobutton(frame, text=text, variable=self.role_var, value=role).pack(anchor=tk.W, padx=20)
         
-        tk.Button(self.root, text="Login", command=self.process_login, width=20).pack(pady=10)
+        tk.Button(frame, text="Login", command=self.process_login, width=20).pack(pady=10)
     
     def process_login(self):
         """Set the user role and level then go to the main menu."""
@@ -107,36 +603,43 @@ class CampfireApp:
             "user": 1
         }
         self.user_level = role_to_level.get(self.user_role, 1)
+        self.engine.user_role = self.user_role
+        self.screens.clear()  # Screens show role-specific buttons; build them again for this role
         self.main_menu()
     
     def main_menu(self):
         """The main menu after login, with options to enter environments, approve pushes (for managers), or logout."""
-        for widget in self.root.winfo_children():
-            widget.destroy()
-        
-        tk.Label(self.root, text="Campfire 1.0 - Main Menu", font=("Arial", 16)).pack(pady=10)
-        tk.Button(self.root, text="Enter Environment(s)", command=self.create_environment_selection_ui, width=40).pack(pady=5)
+        self.screens.show("main", self.build_main_menu)
+    
+    def build_main_menu(self, screen):
+        frame = screen.frame
+        tk.Label(frame, text="Campfire 1.0 - Main Menu", font=("Arial", 16)).pack(pady=10)
+        tk.Button(frame, text="Enter Environment(s)", command=self.create_environment_selection_ui, width=40).pack(pady=5)
         
         # Approve push requests is on the main menu for managers.
         if self.user_role in ["programmer_manager", "user_manager"]:
-            tk.Button(self.root, text="Approve TEST to PROD Push Requests", 
+            tk.Button(frame, text="Approve TEST to PROD Push Requests", 
                       command=self.create_approve_push_requests_ui, width=40).pack(pady=5)
         
-        tk.Button(self.root, text="Logout", command=self.login_screen, width=40).pack(pady=5)
+        tk.Button(frame, text="Compare Environments", command=self.create_drift_ui, width=40).pack(pady=5)
+        tk.Button(frame, text="Logout", command=self.login_screen, width=40).pack(pady=5)
     
     def create_environment_selection_ui(self):
         """Allow the user to select an environment (DEV, TEST, PROD)."""
-        for widget in self.root.winfo_children():
-            widget.destroy()
-        
-        tk.Label(self.root, text="Select Environment", font=("Arial", 16)).pack(pady=10)
-        for env in ["DEV", "TEST", "PROD"]:
-            ttk.Button(self.root, text=env, command=lambda e=env: self.set_environment(e), width=40).pack(pady=5)
+        self.screens.show("environments", self.build_environment_selection)
+    
+    def build_environment_selection(self, screen):
+        frame = screen.frame
+        tk.Label(frame, text="Select Environment", font=("Arial", 16)).pack(pady=10)
+        for env in ENVIRONMENTS:
+            ttk.Button(frame, text=env, command=lambda e=env: self.set_environment(e), width=40).pack(pady=5)
         
-        tk.Button(self.root, text="Back to Main Menu", command=self.main_menu, width=40).pack(pady=5)
+        tk.Button(frame, text="Back to Main Menu", command=self.main_menu, width=40).pack(pady=5)
     
     def set_environment(self, environment):
         self.environment = environment
+        if self.engine.config.get("warm_pool"):
+            self.get_runner().warm(environment)  # Interpreters start while the user picks a sub-app
         self.create_environment_menu()
     
     def create_environment_menu(self):
@@ -145,255 +648,486 @@ class CampfireApp:
         and then directly lists the sub-applications available in the selected environment.
         The original buttons appear at the top.
         """
-        for widget in self.root.winfo_children():
-            widget.destroy()
+        self.screens.show(("environment", self.environment), self.build_environment_menu)
+    
+    def build_environment_menu(self, screen):
+        frame = screen.frame
+        environment = self.environment
         
         # Title
-        title_text = f"Campfire 1.0 - Environment: {self.environment} | Role: {self.user_role.replace('_', ' ').title()}"
-        tk.Label(self.root, text=title_text, font=("Arial", 16)).pack(pady=10)
+        title_text = f"Campfire 1.0 - Environment: {environment} | Role: {self.user_role.replace('_', ' ').title()}"
+        tk.Label(frame, text=title_text, font=("Arial", 16)).pack(pady=10)
         
         # Top action buttons (environment-specific)
-        if self.environment == "DEV" and self.user_role == "programmer":
-            tk.Button(self.root, text="Push from DEV to TEST", command=self.create_push_dev_to_test_ui, width=40).pack(pady=5)
-        elif self.environment == "TEST":
+        if environment == "DEV" and self.user_role == "programmer":
+            tk.Button(frame, text="Push from DEV to TEST", command=self.create_push_dev_to_test_ui, width=40).pack(pady=5)
+        elif environment == "TEST":
             if self.user_role == "programmer":
-                tk.Button(self.root, text="Request Push from TEST to PROD", command=self.create_request_push_ui, width=40).pack(pady=5)
+                tk.Button(frame, text="Request Push from TEST to PROD", command=self.create_request_push_ui, width=40).pack(pady=5)
         # (No push actions for PROD)
         
         if self.user_role in ["programmer_manager", "user_manager"]:
-            tk.Button(self.root, text="Remove Sub-Application", command=self.create_remove_subapp_ui, width=40).pack(pady=5)
+            tk.Button(frame, text="Remove Sub-Application", command=self.create_remove_subapp_ui, width=40).pack(pady=5)
+        
+        tk.Button(frame, text="Run Statistics", command=self.create_run_stats_ui, width=40).pack(pady=5)
         
         # Navigation button at top: Back to Environment Selection
-        tk.Button(self.root, text="Back to Environment Selection", command=self.create_environment_selection_ui, width=40).pack(pady=5)
+        tk.Button(frame, text="Back to Environment Selection", command=self.create_environment_selection_ui, width=40).pack(pady=5)
         
         # Now, list all sub-applications in the current environment
-        tk.Label(self.root, text=f"Sub-Applications in {self.environment}", font=("Arial", 14)).pack(pady=10)
-        canvas = Canvas(self.root)
-        scrollbar = Scrollbar(self.root, orient=tk.VERTICAL, command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
-        scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tk.Label(frame, text=f"Sub-Applications in {environment}", font=("Arial", 14)).pack(pady=10)
+        actions = [("Run", self.run_subapplication)]
+        if self.user_role in ["programmer_manager", "user_manager"]:
+            actions.append(("Remove", self.remove_subapplication))
+        names = self.catalog_names(environment)
+        screen.subapp_list = VirtualSubappList(frame, names(), actions, get_icon=self.get_icon_for_subapp,
+                                               get_path=self.get_path_for_subapp)
+        search = self.create_search_box(screen, environment)
+        screen.subapp_list.pack(fill=tk.BOTH, expand=True)
+        
+        def on_show():
+            changed = names()
+            if changed is not None:
+                search(changed)
+        screen.on_show = on_show
+    
+    def catalog_names(self, directory):
+        """
+        A names source for a sub-application list: call it for the directory's sub-application names,
+        or None when its catalog has not changed since the previous call.
+        """
+        catalog = self.engine.get_catalog(directory)
+        seen_version = None
+        
+        def names():
+            nonlocal seen_version
+            catalog.refresh()  # A directory mtime check while nothing changed
+            if catalog.version == seen_version:
+                return None
+            seen_version = catalog.version
+            return catalog.names()
+        return names
+    
+    def add_subapp_list(self, screen, names, actions, get_icon=None, get_path=None, selectable=False, empty_text=None,
+                        bulk=None):
+        """
+        Give the screen a VirtualSubappList fed by names() (see catalog_names), optionally with bulk
+        action buttons (text, command). Showing the screen again patches the list to the current names.
+        """
+        screen.subapp_list = VirtualSubappList(screen.frame, names() or [], actions, get_icon=get_icon,
+                                               get_path=get_path, selectable=selectable)
+        empty_label = tk.Label(screen.frame, text=empty_text or "")
+        if bulk:
+            self.create_bulk_buttons(screen.frame, *bulk)
+        screen.subapp_list.pack(fill=tk.BOTH, expand=True)
+        
+        def on_show():
+            current = names()
+            if current is not None:
+                screen.subapp_list.update_names(current)
+            if screen.subapp_list.names or not empty_text:
+                empty_label.pack_forget()
+            elif not empty_label.winfo_manager():
+                empty_label.pack(pady=10, before=screen.subapp_list.frame)
+        screen.on_show = on_show
+        on_show()
+    
+    def create_search_box(self, screen, environment):
+        """
+        Search box filtering the screen's sub-application list as the user types, through the
+        environment's search index. A large environment is indexed in the background the first time,
+        and the box is enabled once that is done. Returns update(names), which brings the list up to
+        date after the catalog changed, keeping the query applied.
+        """
+        subapp_list = screen.subapp_list
+        frame = ttk.Frame(screen.frame)
+        frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Label(frame, text="Search:").pack(side=tk.LEFT)
+        query = tk.StringVar()
+        entry = ttk.Entry(frame, textvariable=query)
+        entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        count_label = ttk.Label(frame, text=f"{len(subapp_list.names)} sub-applications")
+        count_label.pack(side=tk.LEFT)
+        index = None
+        
+        def on_change(*_):
+            if index is None:
+                return
+            text = query.get()
+            names = index.search(text)
+            subapp_list.update_names(names)
+            count_label.configure(text=f"{len(names)} of {len(index)}" if text.strip() else f"{len(index)} sub-applications")
+        
+        def ready(built):
+            nonlocal index
+            index = built
+            self.indexed_environments.add(environment)
+            if entry.winfo_exists():  # The screen may have been discarded while indexing
+                entry.configure(state="normal")
+                on_change()
         
-        subapp_names = self.get_subapplications_from_directory(self.environment)
-        for subapp_name in subapp_names:
-            frame = ttk.Frame(scrollable_frame, padding=10)
-            frame.pack(fill=tk.X, pady=5)
-            icon = self.get_icon_for_subapp(subapp_name)
-            icon_label = tk.Label(frame, image=icon)
-            icon_label.image = icon
-            icon_label.pack(side=tk.LEFT, padx=5)
-            details_frame = ttk.Frame(frame)
-            details_frame.pack(side=tk.LEFT, fill=tk.X, expand=True)
-            tk.Label(details_frame, text=f"Name: {subapp_name}").pack(anchor=tk.W)
-            tk.Label(details_frame, text=f"Filename: {subapp_name}.py").pack(anchor=tk.W)
-            ttk.Button(frame, text="Run", command=lambda name=subapp_name: self.run_subapplication(name)).pack(side=tk.RIGHT)
-            if self.user_role in ["programmer_manager", "user_manager"]:
-                ttk.Button(frame, text="Remove", command=lambda name=subapp_name: self.remove_subapplication(name)).pack(side=tk.RIGHT)
+        def update(names):
+            if index is None:
+                subapp_list.update_names(names)
+                count_label.configure(text=f"{len(names)} sub-applications")
+            else:
+                self.engine.search_index(environment)  # Re-indexes only what changed
+                on_change()
+        
+        query.trace_add("write", on_change)
+        entry.bind("<Escape>", lambda e: query.set(""))
+        entry.focus_set()
+        if environment in self.indexed_environments or len(subapp_list.names) <= SEARCH_INLINE_LIMIT:
+            ready(self.engine.search_index(environment))
+        else:
+            entry.configure(state="disabled")
+            count_label.configure(text="Indexing...")
+            self.start_operation(f"Indexing {environment} for search",
+                                 lambda progress: self.engine.search_index(environment), ready,
+                                 f"Error indexing {environment}")
+        return update
     
     ### Environment-Specific Functionality ###
     
     def create_push_dev_to_test_ui(self):
         """Interface for a programmer in DEV to push a sub-application from DEV to TEST."""
-        for widget in self.root.winfo_children():
-            widget.destroy()
-        
-        tk.Label(self.root, text="Push from DEV to TEST", font=("Arial", 14)).pack(pady=10)
-        canvas = Canvas(self.root)
-        scrollbar = Scrollbar(self.root, orient=tk.VERTICAL, command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
-        scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        subapp_names = self.get_subapplications_from_directory("DEV")
-        if not subapp_names:
-            tk.Label(scrollable_frame, text="No sub-applications found in DEV.").pack(pady=10)
-        else:
-            for subapp_name in subapp_names:
-                frame = ttk.Frame(scrollable_frame, padding=10)
-                frame.pack(fill=tk.X, pady=5)
-                icon = self.get_icon_for_subapp(subapp_name)
-                icon_label = tk.Label(frame, image=icon)
-                icon_label.image = icon
-                icon_label.pack(side=tk.LEFT, padx=5)
-                details = ttk.Frame(frame)
-                details.pack(side=tk.LEFT, fill=tk.X, expand=True)
-                tk.Label(details, text=f"Name: {subapp_name}").pack(anchor=tk.W)
-                tk.Label(details, text=f"Filename: {subapp_name}.py").pack(anchor=tk.W)
-                ttk.Button(frame, text="Push to TEST", command=lambda name=subapp_name: self.push_from_dev_to_test(name)).pack(side=tk.RIGHT)
-        
-        tk.Button(self.root, text="Back", command=self.create_environment_menu, width=30).pack(pady=5)
+        self.screens.show("push", self.build_push_dev_to_test)
+    
+    def build_push_dev_to_test(self, screen):
+        tk.Label(screen.frame, text="Push from DEV to TEST", font=("Arial", 14)).pack(pady=10)
+        self.add_subapp_list(screen, self.catalog_names("DEV"), [("Push to TEST", self.push_from_dev_to_test)],
+                             get_icon=lambda name: self.get_icon_for_subapp(name, "DEV"),
+                             get_path=lambda name: self.get_path_for_subapp(name, "DEV"), selectable=True,
+                             empty_text="No sub-applications found in DEV.",
+                             bulk=[("Push Selected to TEST", self.push_selected_from_dev_to_test)])
+        tk.Button(screen.frame, text="Back", command=self.create_environment_menu, width=30).pack(pady=5)
+    
+    def create_bulk_buttons(self, parent, *actions):
+        """Select All / Clear and the (text, command) bulk action buttons for a screen's selectable sub-application list."""
+        frame = ttk.Frame(parent)
+        frame.pack(pady=5)
+        ttk.Button(frame, text="Select All", command=lambda: self.subapp_list.select_all(True)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(frame, text="Clear Selection", command=lambda: self.subapp_list.select_all(False)).pack(side=tk.LEFT, padx=5)
+        for text, command in actions:
+            ttk.Button(frame, text=text, command=command).pack(side=tk.LEFT, padx=5)
     
     def push_from_dev_to_test(self, subapp_name):
-        """Copies a sub-application from DEV to TEST with a default header comment."""
-        source = os.path.join("DEV", f"{subapp_name}.py")
-        destination = os.path.join("TEST", f"{subapp_name}.py")
-        if os.path.exists(source):
-            try:
-                with open(source, 'r') as f:
-                    original_contents = f.read()
-                timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                header = f"#Last push initiated on {timestamp} by {self.user_role.replace('_',' ').title()} from DEV -> TEST\n"
-                new_contents = header + original_contents
-                with open(destination, 'w') as f:
-                    f.write(new_contents)
-                messagebox.showinfo("Success", f"Sub-application '{subapp_name}' has been pushed from DEV to TEST with header.")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error pushing '{subapp_name}': {e}")
-            self.create_push_dev_to_test_ui()  # Refresh
-        else:
-            messagebox.showerror("Error", f"Sub-application '{subapp_name}' not found in DEV.")
+        """Promotes a sub-application from DEV to TEST, recording the push in TEST's provenance."""
+        self.start_operation(
+            f"Pushing '{subapp_name}' to TEST",
+            lambda progress: self.engine.promote([subapp_name], "DEV", "TEST", progress=progress),
+            lambda hashes: self.notifications.show(
+                f"Sub-application '{subapp_name}' has been pushed from DEV to TEST.", "success"),
+            f"Error pushing '{subapp_name}'")
+    
+    def push_selected_from_dev_to_test(self):
+        """Push every selected sub-application from DEV to TEST as one batch."""
+        subapp_list = self.subapp_list
+        subapp_names = subapp_list.selected_names()
+        if not subapp_names:
+            self.notifications.show("No sub-applications selected.")
+            return
+        
+        def pushed(hashes):
+            subapp_list.select_all(False)
+            self.notifications.show(f"{len(hashes)} sub-application(s) have been pushed from DEV to TEST.", "success")
+        
+        self.start_operation(
+            f"Pushing {len(subapp_names)} sub-application(s) to TEST",
+            lambda progress: self.engine.promote(subapp_names, "DEV", "TEST", progress=progress), pushed,
+            f"Error pushing {len(subapp_names)} sub-application(s)")
     
     def create_request_push_ui(self):
         """Interface for a programmer in TEST to request a push from TEST to PROD."""
-        for widget in self.root.winfo_children():
-            widget.destroy()
-        
-        tk.Label(self.root, text="Request Push from TEST to PROD", font=("Arial", 14)).pack(pady=10)
-        canvas = Canvas(self.root)
-        scrollbar = Scrollbar(self.root, orient=tk.VERTICAL, command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
-        scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        subapp_names = self.get_subapplications_from_directory("TEST")
-        if not subapp_names:
-            tk.Label(scrollable_frame, text="No sub-applications found in TEST.").pack(pady=10)
-        else:
-            for subapp_name in subapp_names:
-                frame = ttk.Frame(scrollable_frame, padding=10)
-                frame.pack(fill=tk.X, pady=5)
-                icon = self.get_icon_for_subapp(subapp_name)
-                icon_label = tk.Label(frame, image=icon)
-                icon_label.image = icon
-                icon_label.pack(side=tk.LEFT, padx=5)
-                details = ttk.Frame(frame)
-                details.pack(side=tk.LEFT, fill=tk.X, expand=True)
-                tk.Label(details, text=f"Name: {subapp_name}").pack(anchor=tk.W)
-                tk.Label(details, text=f"Filename: {subapp_name}.py").pack(anchor=tk.W)
-                ttk.Button(frame, text="Request Push", command=lambda name=subapp_name: self.request_push(name)).pack(side=tk.RIGHT)
-        
-        tk.Button(self.root, text="Back", command=self.create_environment_menu, width=30).pack(pady=5)
+        self.screens.show("request", self.build_request_push)
+    
+    def build_request_push(self, screen):
+        tk.Label(screen.frame, text="Request Push from TEST to PROD", font=("Arial", 14)).pack(pady=10)
+        self.add_subapp_list(screen, self.catalog_names("TEST"), [("Request Push", self.request_push)],
+                             get_icon=lambda name: self.get_icon_for_subapp(name, "TEST"),
+                             get_path=lambda name: self.get_path_for_subapp(name, "TEST"), selectable=True,
+                             empty_text="No sub-applications found in TEST.",
+                             bulk=[("Request Push for Selected", self.request_push_for_selected)])
+        tk.Button(screen.frame, text="Back", command=self.create_environment_menu, width=30).pack(pady=5)
     
     def request_push(self, subapp_name):
         """Add a push request (TEST to PROD) for a given sub-application."""
-        if subapp_name in self.push_requests:
-            messagebox.showinfo("Info", f"A push request for '{subapp_name}' already exists.")
-        else:
-            self.push_requests.append(subapp_name)
-            self.save_push_requests()
-            messagebox.showinfo("Submitted", f"Push request for '{subapp_name}' submitted for manager approval.")
-        self.create_request_push_ui()  # Refresh
+        def submitted(added):
+            if not added:
+                self.notifications.show(f"A push request for '{subapp_name}' already exists.")
+            else:
+                self.notifications.show(f"Push request for '{subapp_name}' submitted for manager approval.", "success")
+        
+        self.start_operation(f"Requesting a push for '{subapp_name}'",
+                             lambda progress: self.engine.request_push([subapp_name]), submitted,
+                             f"Error requesting a push for '{subapp_name}'")
+    
+    def request_push_for_selected(self):
+        """Add push requests for every selected sub-application in a single transaction."""
+        subapp_names = self.subapp_list.selected_names()
+        
+        def submitted(added):
+            if not added:
+                self.notifications.show("No new push requests to submit.")
+            else:
+                self.notifications.show(f"{len(added)} push request(s) submitted for manager approval.", "success")
+        
+        self.start_operation(f"Requesting {len(subapp_names)} push(es)",
+                             lambda progress: self.engine.request_push(subapp_names), submitted,
+                             f"Error requesting {len(subapp_names)} push(es)")
     
     def create_approve_push_requests_ui(self):
         """Interface for managers to view and approve push requests (TEST to PROD)."""
-        for widget in self.root.winfo_children():
-            widget.destroy()
+        self.screens.show("approve", self.build_approve_push_requests)
+    
+    def build_approve_push_requests(self, screen):
+        tk.Label(screen.frame, text="Approve Push Requests (TEST to PROD)", font=("Arial", 14)).pack(pady=10)
+        # Pending requests come from the shared queue, which other managers change too: always re-read.
+        def pending_names():
+            self.engine.get_catalog("TEST").refresh()  # Once per load, for the rows' paths
+            return self.engine.push_requests.pending_names()
         
-        tk.Label(self.root, text="Approve Push Requests (TEST to PROD)", font=("Arial", 14)).pack(pady=10)
-        if not self.push_requests:
-            tk.Label(self.root, text="No pending push requests.").pack(pady=10)
-        else:
-            canvas = Canvas(self.root)
-            scrollbar = Scrollbar(self.root, orient=tk.VERTICAL, command=canvas.yview)
-            scrollable_frame = ttk.Frame(canvas)
-            scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-            canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-            canvas.configure(yscrollcommand=scrollbar.set)
-            canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-            
-            for subapp_name in list(self.push_requests):
-                frame = ttk.Frame(scrollable_frame, padding=10)
-                frame.pack(fill=tk.X, pady=5)
-                tk.Label(frame, text=f"Sub-Application: {subapp_name}").pack(side=tk.LEFT, padx=5)
-                ttk.Button(frame, text="Approve", command=lambda name=subapp_name: self.approve_push_request(name)).pack(side=tk.RIGHT)
-        
-        tk.Button(self.root, text="Back to Main Menu", command=self.main_menu, width=40).pack(pady=5)
+        self.add_subapp_list(screen, pending_names,
+                             [("Approve", self.approve_push_request), ("Reject", self.reject_push_request)],
+                             get_path=lambda name: self.get_path_for_subapp(name, "TEST"), selectable=True,
+                             empty_text="No pending push requests.",
+                             bulk=[("Approve Selected", lambda: self.approve_push_requests(self.subapp_list.selected_names())),
+                                   ("Reject Selected", lambda: self.reject_push_requests(self.subapp_list.selected_names()))])
+        tk.Button(screen.frame, text="Back to Main Menu", command=self.main_menu, width=40).pack(pady=5)
     
     def approve_push_request(self, subapp_name):
-        """Manager approves the push request: move sub-application from TEST to PROD with a header."""
-        source = os.path.join("TEST", f"{subapp_name}.py")
-        destination = os.path.join("PROD", f"{subapp_name}.py")
-        if os.path.exists(source):
-            try:
-                with open(source, 'r') as f:
-                    original_contents = f.read()
-                timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                header = f"#Last push initiated on {timestamp} by {self.user_role.replace('_',' ').title()} from TEST -> PROD\n"
-                new_contents = header + original_contents
-                with open(destination, 'w') as f:
-                    f.write(new_contents)
-                os.remove(source)
-                messagebox.showinfo("Approved", f"'{subapp_name}' has been pushed from TEST to PROD with header.")
-                self.push_requests.remove(subapp_name)
-                self.save_push_requests()
-            except Exception as e:
-                messagebox.showerror("Error", f"Error pushing '{subapp_name}': {e}")
-        else:
-            messagebox.showerror("Error", f"'{subapp_name}' not found in TEST.")
-        self.create_approve_push_requests_ui()  # Refresh
+        """Manager approves the push request: move sub-application from TEST to PROD, recording provenance."""
+        def approved(result):
+            names, rejected = result
+            if names:
+                self.notifications.show(f"'{subapp_name}' has been pushed from TEST to PROD.", "success")
+            elif rejected:
+                self.notifications.show(f"'{subapp_name}' is no longer in TEST; its push request was rejected.", "error")
+            else:
+                self.notifications.show(f"The push request for '{subapp_name}' was already handled by another manager.")
+        
+        self.start_operation(f"Approving '{subapp_name}'",
+                             lambda progress: self.engine.approve([subapp_name], progress=progress), approved,
+                             f"Error pushing '{subapp_name}'")
+    
+    def approve_push_requests(self, subapp_names):
+        """Approve several push requests as one batch: one promotion, one queue transaction and one refresh."""
+        if not subapp_names:
+            self.notifications.show("No push requests selected.")
+            return
+        
+        def approved(result):
+            names, rejected = result
+            if names:
+                self.notifications.show(f"{len(names)} sub-application(s) have been pushed from TEST to PROD.", "success")
+            if rejected:
+                self.notifications.show(f"Rejected the push requests for sub-applications no longer in TEST: "
+                                        f"{', '.join(rejected)}", "error")
+            if not names and not rejected:
+                self.notifications.show("The selected push requests were already handled by another manager.")
+        
+        self.start_operation(f"Approving {len(subapp_names)} push request(s)",
+                             lambda progress: self.engine.approve(subapp_names, progress=progress), approved,
+                             f"Error pushing {len(subapp_names)} sub-application(s)")
+    
+    def reject_push_request(self, subapp_name):
+        self.reject_push_requests([subapp_name])
+    
+    def reject_push_requests(self, subapp_names):
+        """Reject push requests; the sub-applications stay in TEST and can be requested again."""
+        if not subapp_names:
+            self.notifications.show("No push requests selected.")
+            return
+        
+        def rejected(names):
+            if names:
+                self.notifications.show(f"Rejected {len(names)} push request(s).", "success")
+            else:
+                self.notifications.show("The selected push requests were already handled by another manager.")
+        
+        self.start_operation(f"Rejecting {len(subapp_names)} push request(s)",
+                             lambda progress: self.engine.reject(subapp_names), rejected,
+                             f"Error rejecting {len(subapp_names)} push request(s)")
     
     def create_remove_subapp_ui(self):
         """Interface to remove a sub-application from the current environment (managers only)."""
-        for widget in self.root.winfo_children():
-            widget.destroy()
-        
-        tk.Label(self.root, text="Remove Sub-Application", font=("Arial", 14)).pack(pady=10)
-        canvas = Canvas(self.root)
-        scrollbar = Scrollbar(self.root, orient=tk.VERTICAL, command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
-        scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        subapp_names = self.get_subapplications_from_directory(self.environment)
-        for subapp_name in subapp_names:
-            frame = ttk.Frame(scrollable_frame, padding=10)
-            frame.pack(fill=tk.X, pady=5)
-            icon = self.get_icon_for_subapp(subapp_name)
-            icon_label = tk.Label(frame, image=icon)
-            icon_label.image = icon
-            icon_label.pack(side=tk.LEFT, padx=5)
-            details = ttk.Frame(frame)
-            details.pack(side=tk.LEFT, fill=tk.X, expand=True)
-            tk.Label(details, text=f"Name: {subapp_name}").pack(anchor=tk.W)
-            tk.Label(details, text=f"Filename: {subapp_name}.py").pack(anchor=tk.W)
-            ttk.Button(frame, text="Remove", command=lambda name=subapp_name: self.remove_subapplication(name)).pack(side=tk.RIGHT)
-        
-        tk.Button(self.root, text="Back", command=self.create_environment_menu, width=30).pack(pady=5)
+        self.screens.show(("remove", self.environment), self.build_remove_subapp)
+    
+    def build_remove_subapp(self, screen):
+        tk.Label(screen.frame, text="Remove Sub-Application", font=("Arial", 14)).pack(pady=10)
+        environment = self.environment
+        self.add_subapp_list(screen, self.catalog_names(environment), [("Remove", self.remove_subapplication)],
+                             get_icon=lambda name: self.get_icon_for_subapp(name, environment),
+                             get_path=lambda name: self.get_path_for_subapp(name, environment))
+        tk.Button(screen.frame, text="Back", command=self.create_environment_menu, width=30).pack(pady=5)
     
     def remove_subapplication(self, subapp_name):
-        if messagebox.askyesno("Confirm Removal", f"Remove '{subapp_name}' from {self.environment}?"):
-            subapp_path = os.path.join(self.environment, f"{subapp_name}.py")
-            if os.path.exists(subapp_path):
-                os.remove(subapp_path)
-                messagebox.showinfo("Removed", f"'{subapp_name}' removed from {self.environment}.")
-                self.create_remove_subapp_ui()
-            else:
-                messagebox.showerror("Error", f"'{subapp_name}' not found in {self.environment}.")
+        environment = self.environment
+        if messagebox.askyesno("Confirm Removal", f"Remove '{subapp_name}' from {environment}?"):
+            self.start_operation(
+                f"Removing '{subapp_name}'",
+                lambda progress: self.engine.remove(environment, [subapp_name], progress=progress),
+                lambda result: self.notifications.show(f"'{subapp_name}' removed from {environment}.", "success"),
+                f"Error removing '{subapp_name}'")
     
     def run_subapplication(self, subapp_name):
-        """Run the selected sub-application from the current environment."""
+        """Run the selected sub-application from the current environment in a worker process."""
         try:
-            subapp_path = os.path.join(self.environment, f"{subapp_name}.py")
-            if os.path.exists(subapp_path):
-                with open(subapp_path) as f:
-                    exec(f.read(), {"__name__": "__main__"})
-            else:
-                raise FileNotFoundError(f"'{subapp_name}' not found in {self.environment}.")
-        except Exception as e:
-            messagebox.showerror("Execution Error", f"Error running '{subapp_name}': {e}")
+            subapp_path, code_path = self.engine.prepare_run(self.environment, subapp_name)
+        except FileNotFoundError as e:
+            self.notifications.show(f"Error running '{subapp_name}': {e}", "error")
+            return
+        self.show_run_panel()
+        self.get_runner().submit(self.environment, subapp_name, subapp_path, code_path=code_path)
+    
+    ### Sub-Application Runs ###
+    
+    def create_run_stats_ui(self):
+        """Run time, CPU time and memory per sub-application in the current environment, slowest p95 first."""
+        self.screens.show(("stats", self.environment), self.build_run_stats)
+    
+    def build_run_stats(self, screen):
+        environment = self.environment
+        tk.Label(screen.frame, text=f"Run Statistics - {environment}", font=("Arial", 14)).pack(pady=10)
+        empty_label = tk.Label(screen.frame, text="No runs recorded yet.")
+        columns = (("name", "Sub-Application", 200), ("runs", "Runs", 60), ("failures", "Failures", 70),
+                   ("wall_p50", "p50", 80), ("wall_p95", "p95", 80), ("cpu_p50", "CPU p50", 80),
+                   ("cpu_p95", "CPU p95", 80), ("peak_memory", "Peak Memory", 100))
+        frame = tk.Frame(screen.frame)
+        tree = ttk.Treeview(frame, columns=[column for column, _, _ in columns], show="headings", height=20)
+        for column, heading, width in columns:
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor=tk.W if column == "name" else tk.E)
+        scrollbar = Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        tk.Button(screen.frame, text="Back to Environment Menu", command=self.create_environment_menu,
+                  width=40).pack(pady=5)
+        shown = {}  # name -> values currently in the tree
+        
+        def on_show():
+            # Rows are keyed by name, so only runs recorded since the screen was last shown touch the tree.
+            stats = self.engine.run_history.stats(environment)
+            for name in [name for name in shown if name not in stats]:
+                tree.delete(name)
+                del shown[name]
+            ordered = sorted(stats.items(), key=lambda item: -(item[1]["wall_p95"] or 0))
+            for position, (name, row) in enumerate(ordered):
+                values = (name, row["runs"], row["failures"], format_seconds(row["wall_p50"]),
+                          format_seconds(row["wall_p95"]), format_seconds(row["cpu_p50"]),
+                          format_seconds(row["cpu_p95"]), format_megabytes(row["peak_memory"]))
+                if name not in shown:
+                    tree.insert("", position, iid=name, values=values)
+                elif shown[name] != values:
+                    tree.item(name, values=values)
+                if tree.index(name) != position:
+                    tree.move(name, "", position)
+                shown[name] = values
+            if stats:
+                empty_label.pack_forget()
+            elif not empty_label.winfo_manager():
+                empty_label.pack(pady=5, before=frame)
+        screen.on_show = on_show
+        on_show()
+    
+    def create_drift_ui(self):
+        """Sub-applications whose content differs between DEV, TEST and PROD, ignoring push headers."""
+        self.screens.show("drift", self.build_drift)
+    
+    def build_drift(self, screen):
+        tk.Label(screen.frame, text="Compare Environments", font=("Arial", 14)).pack(pady=10)
+        show_same = tk.BooleanVar(value=False)
+        status_label = tk.Label(screen.frame, text="Comparing...")
+        status_label.pack(pady=5)
+        columns = [("name", "Sub-Application", 200)] + [(env, env, 90) for env in ENVIRONMENTS] + [("status", "Status", 220)]
+        frame = tk.Frame(screen.frame)
+        tree = ttk.Treeview(frame, columns=[column for column, _, _ in columns], show="headings", height=20)
+        for column, heading, width in columns:
+            tree.heading(column, text=heading)
+            tree.column(column, width=width)
+        scrollbar = Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        shown = {}  # name -> values currently in the tree
+        rows = {}
+        comparing = False
+        
+        def patch():
+            if not tree.winfo_exists():  # The screen was discarded while comparing
+                return
+            wanted = {}
+            for name, hashes in rows.items():
+                status = drift_status(hashes)
+                if status != "same" or show_same.get():
+                    wanted[name] = (name, *((hashes[env] or "-")[:8] for env in ENVIRONMENTS), status)
+            for name in [name for name in shown if name not in wanted]:
+                tree.delete(name)
+                del shown[name]
+            for position, (name, values) in enumerate(wanted.items()):  # rows are sorted by name
+                if name not in shown:
+                    tree.insert("", position, iid=name, values=values)
+                elif shown[name] != values:
+                    tree.item(name, values=values)
+                shown[name] = values
+            drifted = sum(values[-1] != "same" for values in wanted.values())
+            status_label.configure(text=f"{drifted} of {len(rows)} sub-application(s) differ between environments.")
+        
+        def compared(result):
+            nonlocal comparing, rows
+            comparing = False
+            rows = result
+            patch()
+        
+        def failed(error):
+            nonlocal comparing
+            comparing = False
+            self.notifications.show(f"Error comparing environments: {error}", "error")
+        
+        def on_show():
+            # Compared in the background: a first comparison hashes every sub-application. Later ones
+            # only stat the files, and rows are patched by name, so re-showing the screen is cheap.
+            nonlocal comparing
+            if not comparing:
+                comparing = True
+                self.get_tasks().submit(lambda progress: self.engine.drift(), compared, failed, lambda done, total: None)
+        
+        ttk.Checkbutton(screen.frame, text="Show sub-applications that are the same everywhere", variable=show_same,
+                        command=patch).pack(pady=5)
+        buttons = ttk.Frame(screen.frame)
+        buttons.pack(pady=5)
+        tk.Button(buttons, text="Refresh", command=on_show, width=18).pack(side=tk.LEFT, padx=5)
+        tk.Button(buttons, text="Back to Main Menu", command=self.main_menu, width=18).pack(side=tk.LEFT, padx=5)
+        screen.on_show = on_show
+        on_show()
+    
+    def get_runner(self):
+        if self.runner is None:
+            self.runner = self.engine.create_runner(on_output=self.on_run_output, on_status=self.on_run_status,
+                                                    warm=True)
+            self.root.after(100, self.poll_runs)
+        return self.runner
+    
+    def show_run_panel(self):
+        if self.run_panel is None or not self.run_panel.exists():
+            self.run_panel = RunPanel(self.root, self.get_runner())
+        self.run_panel.window.lift()
+    
+    def poll_runs(self):
+        """Collect output and status changes from worker processes without blocking the event loop."""
+        self.runner.poll()
+        self.root.after(100, self.poll_runs)
+    
+    def on_run_output(self, run, stream_name, text):
+        if self.run_panel is not None and self.run_panel.exists():
+            self.run_panel.append_output(run, stream_name, text)
+    
+    def on_run_status(self, run):
+        if self.run_panel is not None and self.run_panel.exists():
+            self.run_panel.update_run(run)
 
 if __name__ == "__main__":
-    CampfireApp()
+    CampfireApp(startup_report="--startup-report" in sys.argv)
@@ -2,25 +2,431 @@
 #Last push initiated on 2025-02-05 13:22:47 by Programmer from DEV -> TEST
 import tkinter as tk
 from tkinter import filedialog
+import argparse
 import csv
+import glob
+import hashlib
+import io
+import json
+import locale
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from array import array
+from collections import deque
+from itertools import accumulate, chain, islice
+from concurrent.futures import ProcessPoolExecutor
 
-# Function to convert CSV to GLIM
-def csv_to_glim(csv_file, glim_file):
-    with open(csv_file, mode='r') as infile, open(glim_file, mode='w') as outfile:
-        reader = csv.reader(infile)
-        for row in reader:
-            # Example conversion logic; replace it with your specific logic
-            formatted_row = ' '.join(row) + '\n'
-            outfile.write(formatted_row)
-
-# Function to convert GLIM to CSV
-def glim_to_csv(glim_file, csv_file):
-    with open(glim_file, mode='r') as infile, open(csv_file, mode='w', newline='') as outfile:
-        writer = csv.writer(outfile)
-        for line in infile:
-            # Example conversion logic; adjust as necessary
-            row = line.strip().split(' ')
-            writer.writerow(row)
+# Conversion works on large text blocks that always end on a row boundary, instead of row by row.
+BLOCK_SIZE = 4 * 1024 * 1024                 # Characters read per block
+PARALLEL_THRESHOLD = 64 * 1024 * 1024        # Files at least this large are converted across cores
+
+# A GLIM file may have a .glim.idx sidecar: a header, then the byte offset of every stride-th row.
+INDEX_STRIDE = 1024                          # Default rows between stored offsets
+INDEX_MAGIC = b"GLIMIDX1"
+INDEX_HEADER = struct.Struct("<8sIQQQ")      # Magic, stride, rows, GLIM size, GLIM mtime (ns)
+TEXT_ENCODING = locale.getpreferredencoding(False)  # What open() uses for the text files
+
+# Quote state of CSV text as csv.reader sees it: a quote opens a quoted field only at the start of a
+# field (anywhere else it is a literal character), and inside a quoted field "" is an escaped quote.
+# CSV_QUOTE_STATE matches from the start of a row up to a quoted field that is still open, if any;
+# CSV_CLOSING_QUOTE matches from inside a quoted field to its closing quote.
+CSV_QUOTE_STATE = re.compile(r'[^"]*(?:(?:(?<![^,\n])"(?:[^"]*"")*[^"]*"(?!")|(?<=[^,\n])")[^"]*)*')
+CSV_CLOSING_QUOTE = re.compile(r'(?:[^"]*"")*[^"]*"(?!")')
+
+# Function to convert one block of CSV text (whole rows) to GLIM text
+def csv_block_to_glim(block):
+    if '"' not in block:
+        # Without quoting, csv.reader just splits on commas, so ' '.join(row) is a plain replace.
+        glim = block.replace(',', ' ')
+    else:
+        glim = '\n'.join(map(' '.join, csv.reader(io.StringIO(block)))) + '\n'
+    if glim and not glim.endswith('\n'):
+        glim += '\n'
+    return glim
+
+# Function to convert one block of GLIM text (whole lines) to CSV text
+def glim_block_to_csv(block):
+    lines = block.split('\n')
+    if lines[-1] == '':
+        lines.pop()  # The block ends with a newline
+    if ',' not in block and '"' not in block:
+        # No field can need quoting; csv.writer only quotes the single empty field of a blank line.
+        return ''.join((line.strip().replace(' ', ',') or '""') + '\r\n' for line in lines)
+    # Only lines with a comma or a quote have a field that needs quoting; the rest skip csv.writer.
+    out = io.StringIO()
+    write = out.write
+    writerow = csv.writer(out).writerow
+    for line in lines:
+        if ',' in line or '"' in line:
+            writerow(line.strip().split(' '))
+        else:
+            write((line.strip().replace(' ', ',') or '""') + '\r\n')
+    return out.getvalue()
+
+# Function to tell whether CSV text, read from the start of a row (or from inside a quoted field
+# when in_quotes), ends inside a quoted field that carries on into the next line
+def ends_in_quotes(text, in_quotes=False):
+    position = 0
+    if in_quotes:
+        closing = CSV_CLOSING_QUOTE.match(text)
+        if closing is None:
+            return True
+        position = closing.end()
+    return text.startswith('"', CSV_QUOTE_STATE.match(text, position).end())
+
+# Function to read a text file as blocks that end on a row boundary
+def read_blocks(infile, block_size=BLOCK_SIZE, balance_quotes=False):
+    while True:
+        block = infile.read(block_size)
+        if not block:
+            return
+        block += infile.readline()
+        if balance_quotes and '"' in block and ends_in_quotes(block):
+            # A quoted CSV field runs past the block; read whole lines until it is closed. Each line
+            # is scanned once, and only if it has a quote, so a long field costs linear time.
+            lines = []
+            in_quotes = True
+            while in_quotes:
+                line = infile.readline()
+                if not line:
+                    break
+                lines.append(line)
+                in_quotes = '"' not in line or ends_in_quotes(line, True)
+            block += ''.join(lines)
+        yield block
+
+# Function to convert an open CSV file to GLIM text blocks on one core. Blocks without quotes are
+# converted as plain text; from the first quote on, csv.reader reads the rest of the file itself,
+# so rows are never cut apart and the quote state never has to be scanned separately.
+def csv_file_to_glim(infile, block_size=BLOCK_SIZE):
+    for block in read_blocks(infile, block_size):
+        if '"' in block:
+            rows = csv.reader(chain(io.StringIO(block), infile))
+            rows_per_block = max(1, block.count('\n'))
+            while True:
+                # Joined straight from the reader: a list of row lists would keep the GC busy.
+                lines_read = rows.line_num
+                glim = '\n'.join(map(' '.join, islice(rows, rows_per_block)))
+                if rows.line_num == lines_read:
+                    return
+                yield glim + '\n'
+        yield csv_block_to_glim(block)
+
+# Function to get the path of a GLIM file's sidecar row index
+def index_path(glim_file):
+    return glim_file + ".idx"
+
+# Function to write a sidecar row index holding the byte offset of every stride-th row
+def write_index(glim_file, stride, rows, offsets):
+    stat = os.stat(glim_file)
+    data = array('Q', offsets)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    tmp_path = index_path(glim_file) + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, stride, rows, stat.st_size, stat.st_mtime_ns))
+        f.write(data.tobytes())
+    os.replace(tmp_path, index_path(glim_file))
+
+# Function to load a GLIM file's sidecar row index; returns None if it is missing or out of date
+def load_index(glim_file):
+    try:
+        with open(index_path(glim_file), 'rb') as f:
+            header = f.read(INDEX_HEADER.size)
+            data = f.read()
+        stat = os.stat(glim_file)
+    except OSError:
+        return None
+    if len(header) < INDEX_HEADER.size:
+        return None
+    magic, stride, rows, size, mtime_ns = INDEX_HEADER.unpack(header)
+    if magic != INDEX_MAGIC or (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+        return None
+    offsets = array('Q')
+    offsets.frombytes(data)
+    if sys.byteorder != 'little':
+        offsets.byteswap()
+    return {"stride": stride, "rows": rows, "offsets": offsets}
+
+# Function to build the sidecar row index of an existing GLIM file by scanning it once
+def build_index(glim_file, stride=INDEX_STRIDE):
+    rows = 0
+    offsets = []
+    with open(glim_file, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                position = 0
+                while position < size:
+                    if rows % stride == 0:
+                        offsets.append(position)
+                    end = mm.find(b'\n', position)
+                    position = size if end < 0 else end + 1
+                    rows += 1
+    write_index(glim_file, stride, rows, offsets)
+    return load_index(glim_file)
+
+# Function to find the byte offset where a row starts, walking at most one stride from the index
+def row_offset(mm, index, row):
+    if row >= index["rows"]:
+        return len(mm)
+    position = index["offsets"][row // index["stride"]]
+    for _ in range(row % index["stride"]):
+        position = mm.find(b'\n', position) + 1
+    return position
+
+# Function to read rows [start, stop) of an indexed GLIM file without scanning from the start
+def read_rows(glim_file, start, stop=None):
+    index = load_index(glim_file)
+    if index is None:
+        raise ValueError(f"{index_path(glim_file)} is missing or out of date")
+    stop = index["rows"] if stop is None else min(stop, index["rows"])
+    if start >= stop:
+        return []
+    with open(glim_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        text = mm[row_offset(mm, index, start):row_offset(mm, index, stop)].decode(TEXT_ENCODING)
+    lines = text.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    return [line.rstrip('\r') for line in lines]
+
+# Function to split an indexed GLIM file into about `chunks` byte ranges of whole rows
+def split_chunks(glim_file, chunks, index=None):
+    index = index or load_index(glim_file)
+    if index is None:
+        raise ValueError(f"{index_path(glim_file)} is missing or out of date")
+    offsets = index["offsets"]
+    step = max(1, -(-len(offsets) // chunks))
+    bounds = list(offsets[::step]) + [os.path.getsize(glim_file)]
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+# Function to convert one byte range of an indexed GLIM file to CSV text
+def glim_chunk_to_csv(glim_file, start, end):
+    with open(glim_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        block = mm[start:end].decode(TEXT_ENCODING)
+    return glim_block_to_csv(block)
+
+# Function to convert a whole file block by block, in parallel for large files, keeping row order
+def convert_file(convert_block, in_path, out_path, out_newline, balance_quotes,
+                 block_size=BLOCK_SIZE, workers=None, parallel_threshold=PARALLEL_THRESHOLD, max_mb_per_s=None,
+                 index_stride=None, convert_chunk=None, convert_serial=None):
+    started = time.perf_counter()
+    in_bytes = os.path.getsize(in_path)
+    rows = 0
+    offsets = []
+    pool = None
+    if workers != 1 and in_bytes >= parallel_threshold:
+        workers = workers or os.cpu_count() or 1
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    # With a row index on the input, workers read their own byte ranges instead of being sent text.
+    index = load_index(in_path) if pool is not None and convert_chunk else None
+
+    with open(in_path, mode='r', newline=None) as infile, open(out_path, mode='w', newline=out_newline) as outfile:
+        def write(text, consumed):
+            nonlocal rows
+            count = text.count('\n')
+            first = (-rows) % index_stride if index_stride else count
+            if first < count:
+                # Record the output byte offset of every stride-th row as it is written.
+                lengths = list(accumulate(map(len, text.split('\n'))))
+                position = 0
+                for i in range(first, count, index_stride):
+                    row_start = lengths[i - 1] + i if i else 0  # Plus one newline per earlier row
+                    outfile.write(text[position:row_start])
+                    offsets.append(outfile.tell())
+                    position = row_start
+                text = text[position:]
+            outfile.write(text)
+            rows += count
+            if max_mb_per_s:
+                # Throttle to the requested rate, measured on input consumed so far.
+                ahead = consumed / (max_mb_per_s * 1024 * 1024) - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+        if pool is None:
+            if convert_serial is not None:
+                blocks = convert_serial(infile, block_size)
+            else:
+                blocks = map(convert_block, read_blocks(infile, block_size, balance_quotes))
+            for text in blocks:
+                write(text, infile.buffer.tell())
+        else:
+            with pool:
+                in_flight = deque()
+                if index is not None:
+                    for start, end in split_chunks(in_path, max(workers, in_bytes // block_size), index):
+                        in_flight.append((pool.submit(convert_chunk, in_path, start, end), end))
+                        if len(in_flight) >= 2 * workers:
+                            future, consumed = in_flight.popleft()
+                            write(future.result(), consumed)
+                else:
+                    for block in read_blocks(infile, block_size, balance_quotes):
+                        in_flight.append((pool.submit(convert_block, block), infile.buffer.tell()))
+                        if len(in_flight) >= 2 * workers:
+                            future, consumed = in_flight.popleft()
+                            write(future.result(), consumed)
+                while in_flight:
+                    future, consumed = in_flight.popleft()
+                    write(future.result(), consumed)
+
+    if index_stride:
+        write_index(out_path, index_stride, rows, offsets)
+    seconds = time.perf_counter() - started
+    report = {
+        "input": in_path,
+        "output": out_path,
+        "rows": rows,
+        "bytes": in_bytes,
+        "seconds": seconds,
+        "mb_per_s": in_bytes / (1024 * 1024) / seconds if seconds else 0.0,
+        "workers": workers if pool is not None else 1,
+    }
+    if index_stride:
+        report["index"] = index_path(out_path)
+    return report
+
+# Function to convert CSV to GLIM, optionally writing a sidecar row index every `index_stride` rows
+def csv_to_glim(csv_file, glim_file, **options):
+    return convert_file(csv_block_to_glim, csv_file, glim_file, None, True, convert_serial=csv_file_to_glim, **options)
+
+# Function to convert GLIM to CSV, splitting the work along the sidecar row index when there is one
+def glim_to_csv(glim_file, csv_file, **options):
+    return convert_file(glim_block_to_csv, glim_file, csv_file, '', False, convert_chunk=glim_chunk_to_csv, **options)
+
+# Function to print the end-of-run report
+def print_report(report):
+    print(f"Converted {report['input']} to {report['output']}: {report['rows']} rows, "
+          f"{report['bytes'] / (1024 * 1024):.1f} MB in {report['seconds']:.2f} s "
+          f"({report['mb_per_s']:.1f} MB/s, {report['workers']} worker(s))")
+
+# Batch directions: (converter, input extension, output extension)
+DIRECTIONS = {
+    "csv2glim": (csv_to_glim, ".csv", ".glim"),
+    "glim2csv": (glim_to_csv, ".glim", ".csv"),
+}
+BATCH_STATE_FILE = ".glim-csv-batch.json"    # Source hashes of converted files, kept in the output directory
+BATCH_SUMMARY_FILE = "glim-csv-summary.json"
+
+# Function to list the input files of a batch: every matching file in a directory, or a glob pattern
+def batch_sources(source, extension):
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source) if name.lower().endswith(extension)]
+    else:
+        paths = glob.glob(source)
+    return sorted(path for path in paths if os.path.isfile(path))
+
+# Function to hash a file's contents
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Function to convert one batch file; runs in a worker process
+def convert_batch_item(direction, in_path, out_path, known_hash=None, options=None):
+    result = {"input": in_path, "output": out_path}
+    try:
+        if known_hash is not None:
+            result["sha256"] = file_sha256(in_path)
+            if result["sha256"] == known_hash and os.path.exists(out_path):
+                result["status"] = "skipped"
+                return result
+        # Write beside the output and rename, so a failed run never leaves a fresh-looking partial file.
+        part_path = out_path + ".part"
+        try:
+            report = DIRECTIONS[direction][0](in_path, part_path, workers=1, **(options or {}))
+            os.replace(part_path, out_path)
+            if "index" in report:
+                os.replace(index_path(part_path), index_path(out_path))
+                report["index"] = index_path(out_path)
+        finally:
+            for leftover in (part_path, index_path(part_path)):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        result.update(report, output=out_path, status="converted")
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        # No hash for a failed file, so the next --check hash run converts it again.
+        result.pop("sha256", None)
+        result.update(status="failed", error=str(e))
+    return result
+
+# Function to convert every file of a batch across a process pool and write a JSON summary
+def convert_batch(source, direction, output_dir, check="mtime", workers=None, summary_path=None, index_stride=None):
+    started = time.perf_counter()
+    in_extension, out_extension = DIRECTIONS[direction][1:]
+    options = {"index_stride": index_stride} if index_stride and direction == "csv2glim" else {}
+    os.makedirs(output_dir, exist_ok=True)
+    state_path = os.path.join(output_dir, BATCH_STATE_FILE)
+    state = {}
+    if check == "hash" and os.path.exists(state_path):
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+
+    results = []
+    jobs = []
+    claimed = set()
+    for in_path in batch_sources(source, in_extension):
+        out_name = os.path.splitext(os.path.basename(in_path))[0] + out_extension
+        out_path = os.path.join(output_dir, out_name)
+        if out_name in claimed:
+            results.append({"input": in_path, "output": out_path, "status": "failed",
+                            "error": "another input already converts to this output"})
+            continue
+        claimed.add(out_name)
+        # An output converted before indexing was asked for is never up to date.
+        missing_index = bool(options) and not os.path.exists(index_path(out_path))
+        if (check == "mtime" and not missing_index and os.path.exists(out_path)
+                and os.path.getmtime(out_path) >= os.path.getmtime(in_path)):
+            results.append({"input": in_path, "output": out_path, "status": "skipped"})
+        elif check == "hash":
+            jobs.append((in_path, out_path, "" if missing_index else state.get(out_name, "")))
+        else:
+            jobs.append((in_path, out_path, None))
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs)) or 1
+    job_results = []
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(convert_batch_item, direction, *job, options) for job in jobs]
+            job_results = [future.result() for future in futures]
+    results.extend(job_results)
+    results.sort(key=lambda result: result["input"])
+
+    if check == "hash":
+        for result in job_results:
+            out_name = os.path.basename(result["output"])
+            if result["status"] in ("converted", "skipped"):
+                state[out_name] = result["sha256"]
+            else:
+                state.pop(out_name, None)
+        with open(state_path + ".tmp", 'w') as f:
+            json.dump(state, f, indent=4)
+        os.replace(state_path + ".tmp", state_path)
+
+    summary = {
+        "source": source,
+        "direction": direction,
+        "output_dir": output_dir,
+        "check": check,
+        "workers": workers,
+        "seconds": time.perf_counter() - started,
+        "converted": sum(result["status"] == "converted" for result in results),
+        "skipped": sum(result["status"] == "skipped" for result in results),
+        "failed": sum(result["status"] == "failed" for result in results),
+        "bytes": sum(result.get("bytes", 0) for result in results),
+        "files": results,
+    }
+    summary_path = summary_path or os.path.join(output_dir, BATCH_SUMMARY_FILE)
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=4)
+    summary["summary_path"] = summary_path
+    return summary
 
 # Function to open file dialog and select CSV file
 def select_csv_file():
@@ -44,6 +450,52 @@ def save_glim_file():
 
 # Main function to run the program
 def main():
+    parser = argparse.ArgumentParser(description="Convert between CSV and GLIM files.")
+    parser.add_argument("--workers", type=int, help="processes for large files (default: all cores; 1 disables)")
+    parser.add_argument("--max-mb-per-s", type=float, help="limit conversion throughput to this many MB/s")
+    batch = parser.add_argument_group("batch mode", "convert many files without prompts or dialogs")
+    batch.add_argument("--batch", metavar="SOURCE", help="directory or glob pattern of files to convert")
+    batch.add_argument("--direction", choices=sorted(DIRECTIONS), help="conversion direction")
+    batch.add_argument("--output-dir", help="directory for converted files")
+    batch.add_argument("--check", choices=["mtime", "hash"], default="mtime",
+                       help="how to tell an output is up to date (default: mtime)")
+    batch.add_argument("--summary", help=f"path of the JSON summary (default: OUTPUT_DIR/{BATCH_SUMMARY_FILE})")
+    index = parser.add_argument_group("row index", "random access into GLIM files through a .glim.idx sidecar")
+    index.add_argument("--index", type=int, nargs="?", const=INDEX_STRIDE, metavar="STRIDE",
+                       help=f"write a row index when converting CSV to GLIM (default stride: {INDEX_STRIDE} rows)")
+    index.add_argument("--build-index", metavar="GLIM", help="write the row index of an existing GLIM file")
+    index.add_argument("--read-rows", nargs=3, metavar=("GLIM", "START", "STOP"),
+                       help="print rows START to STOP (exclusive) of an indexed GLIM file")
+    args = parser.parse_args()
+    options = {"workers": args.workers, "max_mb_per_s": args.max_mb_per_s}
+
+    if args.build_index:
+        built = build_index(args.build_index, args.index or INDEX_STRIDE)
+        print(f"Indexed {built['rows']} rows of {args.build_index} every {built['stride']} rows")
+        return 0
+    if args.read_rows:
+        glim_file, start, stop = args.read_rows
+        try:
+            rows = read_rows(glim_file, int(start), int(stop))
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        for row in rows:
+            print(row)
+        return 0
+
+    if args.batch:
+        if not args.direction or not args.output_dir:
+            parser.error("--batch requires --direction and --output-dir")
+        summary = convert_batch(args.batch, args.direction, args.output_dir, args.check, args.workers, args.summary,
+                                args.index)
+        for result in summary["files"]:
+            if result["status"] == "failed":
+                print(f"Failed {result['input']}: {result['error']}", file=sys.stderr)
+        print(f"Converted {summary['converted']}, skipped {summary['skipped']}, failed {summary['failed']} "
+              f"in {summary['seconds']:.2f} s; summary written to {summary['summary_path']}")
+        return 1 if summary["failed"] else 0
+
     root = tk.Tk()
     root.withdraw()  # Hide the root window
 
@@ -54,16 +506,14 @@ def main():
         # CSV to GLIM conversion
         csv_file = select_csv_file()
         glim_file = save_glim_file()
-        csv_to_glim(csv_file, glim_file)
-        print(f"Converted {csv_file} to {glim_file}")
+        print_report(csv_to_glim(csv_file, glim_file, index_stride=args.index, **options))
     elif conversion_type == "2":
         # GLIM to CSV conversion
         glim_file = select_glim_file()
         csv_file = save_csv_file()
-        glim_to_csv(glim_file, csv_file)
-        print(f"Converted {glim_file} to {csv_file}")
+        print_report(glim_to_csv(glim_file, csv_file, **options))
     else:
         print("Invalid choice. Exiting...")
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+Benchmarks for Campfire's hot paths, run against synthetic environments so results are reproducible.
+
+    python campfire_bench.py                          # 10..10,000 sub-apps, 1 MB..100 MB conversions
+    python campfire_bench.py --quick                  # a fast subset, for checking a change
+    python campfire_bench.py --sizes 1MB 1GB 10GB     # larger conversions (needs the disk space)
+    python campfire_bench.py --save-baseline          # make this run the baseline to compare against
+    xvfb-run python campfire_bench.py                 # include the Tk menu build on a machine without a display
+
+Every run is written to .campfire/bench/ as JSON and compared with the baseline (bench_baseline.json).
+The exit status is 1 if any result is more than --tolerance worse than the baseline.
+"""
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from campfire_core import CampfireEngine, ENVIRONMENTS, STATE_DIR, write_json_atomic
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(HERE, "bench_baseline.json")
+RESULTS_DIR = os.path.join(HERE, STATE_DIR, "bench")
+GLIM_CSV_SCRIPT = os.path.join(HERE, "DEV", "GLIM-CSV.py")
+
+DEFAULT_APP_COUNTS = [10, 100, 1000, 10000]
+DEFAULT_SIZES = ["1MB", "10MB", "100MB"]
+QUICK_APP_COUNTS = [10, 100]
+QUICK_SIZES = ["1MB"]
+SAMPLES = 5  # Repeats per latency measurement; the median is reported
+
+SUBAPP_SOURCE = '"""Synthetic sub-application {index} for benchmarks."""\nprint("App{index:05d}")\n'
+CSV_ROWS = (
+    '1024,alpha,3.14159,2025-02-05,ok\n'
+    '2048,"beta, gamma",2.71828,2025-02-06,"said ""hi"""\n'
+    '4096,delta,1.41421,2025-02-07,ok\n'
+)
+
+def parse_size(text):
+    """'1MB', '10GB' or a plain byte count, in bytes."""
+    units = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+    text = text.upper()
+    for unit, factor in units.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+def median_seconds(func, samples=SAMPLES):
+    """Median wall time of `samples` calls of func(i)."""
+    times = []
+    for i in range(samples):
+        started = time.perf_counter()
+        func(i)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+def timed(func):
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+def make_environment(root, app_count):
+    """Create DEV/TEST/PROD under root with app_count sub-applications in DEV."""
+    for directory in ENVIRONMENTS:
+        os.makedirs(os.path.join(root, directory))
+    for index in range(app_count):
+        with open(os.path.join(root, "DEV", f"App{index:05d}.py"), 'w') as f:
+            f.write(SUBAPP_SOURCE.format(index=index))
+
+def load_glim_csv():
+    """Import DEV/GLIM-CSV.py as a module; registered in sys.modules so its process pools can pickle."""
+    spec = importlib.util.spec_from_file_location("glim_csv", GLIM_CSV_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["glim_csv"] = module
+    spec.loader.exec_module(module)
+    return module
+
+def bench_menu():
+    """
+    Build the DEV environment menu in a real Tk window, then show it again from the screen cache;
+    returns (build seconds, show seconds), or None without a display.
+    """
+    import tkinter as tk
+    from Campfire import CampfireApp
+    try:
+        app = CampfireApp(mainloop=False)
+    except tk.TclError:
+        return None
+    try:
+        app.user_role = app.engine.user_role = "programmer"
+        app.environment = "DEV"
+        app.get_subapplications_from_directory("DEV")  # Measure the build, not the first catalog scan
+
+        def build(_):
+            app.screens.clear()
+            app.create_environment_menu()
+            app.root.update_idletasks()
+
+        def show(_):
+            app.main_menu()
+            app.create_environment_menu()
+            app.root.update_idletasks()
+        return median_seconds(build), median_seconds(show)
+    finally:
+        app.quit()
+
+def bench_launcher(results, app_count, with_menu):
+    """Catalog, menu, push and approve timings for one synthetic environment size."""
+    suffix = f"[{app_count} apps]"
+    names = [f"App{index:05d}" for index in range(app_count)]
+    singles = names[:SAMPLES]
+
+    results[f"get_subapplications_from_directory cold {suffix}"] = (
+        timed(lambda: CampfireEngine(config={}).list_subapplications("DEV")), "s")
+    results[f"get_subapplications_from_directory warm {suffix}"] = (
+        median_seconds(lambda _: CampfireEngine(config={}).list_subapplications("DEV")), "s")
+    engine = CampfireEngine(user_role="programmer", config={})
+    results[f"get_subapplications_from_directory hot {suffix}"] = (
+        median_seconds(lambda _: engine.list_subapplications("DEV")), "s")
+
+    if with_menu:
+        seconds = bench_menu()
+        if seconds is None:
+            print("  no display: skipped the environment menu build (try xvfb-run)", file=sys.stderr)
+        else:
+            results[f"environment menu build {suffix}"] = (seconds[0], "s")
+            results[f"environment menu show {suffix}"] = (seconds[1], "s")
+
+    results[f"push_from_dev_to_test one {suffix}"] = (
+        median_seconds(lambda i: engine.promote([singles[i]], "DEV", "TEST"), len(singles)), "s")
+    results[f"push_from_dev_to_test all {suffix}"] = (timed(lambda: engine.promote(names, "DEV", "TEST")), "s")
+
+    engine.request_push(names)
+    results[f"approve_push_request one {suffix}"] = (
+        median_seconds(lambda i: engine.approve([singles[i]]), len(singles)), "s")
+    results[f"approve_push_request all {suffix}"] = (timed(lambda: engine.approve(names[SAMPLES:])), "s")
+
+def write_synthetic_csv(path, size):
+    """Write about `size` bytes of CSV mixing plain rows with quoted fields."""
+    chunk = CSV_ROWS * max(1, (1024 * 1024) // len(CSV_ROWS))
+    with open(path, 'w', newline='') as f:
+        written = 0
+        while written < size:
+            piece = chunk if size - written >= len(chunk) else CSV_ROWS * max(1, (size - written) // len(CSV_ROWS))
+            f.write(piece)
+            written += len(piece)
+
+def bench_conversion(results, glim_csv, workdir, size_text):
+    """csv_to_glim and glim_to_csv throughput in MB/s for one input size."""
+    csv_path = os.path.join(workdir, "input.csv")
+    glim_path = os.path.join(workdir, "output.glim")
+    write_synthetic_csv(csv_path, parse_size(size_text))
+    try:
+        results[f"csv_to_glim [{size_text}]"] = (glim_csv.csv_to_glim(csv_path, glim_path)["mb_per_s"], "MB/s")
+        results[f"glim_to_csv [{size_text}]"] = (
+            glim_csv.glim_to_csv(glim_path, os.path.join(workdir, "roundtrip.csv"))["mb_per_s"], "MB/s")
+    finally:
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+
+def run_benchmarks(app_counts, sizes, with_menu=True, workdir=None):
+    """Run every benchmark in a scratch directory; returns {name: (value, unit)}."""
+    results = {}
+    scratch = tempfile.mkdtemp(prefix="campfire-bench-", dir=workdir)
+    cwd = os.getcwd()
+    try:
+        for app_count in app_counts:
+            root = os.path.join(scratch, f"env{app_count}")
+            make_environment(root, app_count)
+            os.chdir(root)  # Campfire works on DEV/TEST/PROD relative to the current directory
+            try:
+                bench_launcher(results, app_count, with_menu)
+            finally:
+                os.chdir(cwd)
+            shutil.rmtree(root)
+            print(f"  launcher benchmarks done for {app_count} sub-apps", file=sys.stderr)
+
+        if sizes:
+            glim_csv = load_glim_csv()
+            conversions = os.path.join(scratch, "conversions")
+            os.makedirs(conversions)
+            for size_text in sizes:
+                bench_conversion(results, glim_csv, conversions, size_text)
+                print(f"  conversion benchmarks done for {size_text}", file=sys.stderr)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+def compare(results, baseline, tolerance, min_delta):
+    """
+    Print each result next to its baseline; returns the names that regressed beyond tolerance.
+    Timings that moved by less than min_delta seconds are never counted, since they are mostly noise.
+    """
+    regressions = []
+    width = max(len(name) for name in results)
+    for name, (value, unit) in results.items():
+        line = f"{name:<{width}}  {value:12.4f} {unit:<4}"
+        if name in baseline:
+            base = baseline[name]["value"]
+            # Seconds regress upwards, throughput regresses downwards.
+            change = (value - base) / base if base else 0.0
+            worse = change if unit == "s" else -change
+            line += f"  baseline {base:12.4f}  {change:+7.1%}"
+            if worse > tolerance and (unit != "s" or value - base >= min_delta):
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Campfire's launcher hot paths and GLIM-CSV throughput.")
+    parser.add_argument("--apps", type=int, nargs="+", help=f"sub-app counts to test (default: {DEFAULT_APP_COUNTS})")
+    parser.add_argument("--sizes", nargs="*", help=f"conversion input sizes, e.g. 1MB 10GB (default: {DEFAULT_SIZES})")
+    parser.add_argument("--quick", action="store_true", help=f"only {QUICK_APP_COUNTS} sub-apps and {QUICK_SIZES}")
+    parser.add_argument("--no-menu", action="store_true", help="skip the Tk environment-menu benchmark")
+    parser.add_argument("--workdir", help="where to create the synthetic environments and files (default: system temp)")
+    parser.add_argument("--output", help=f"results file (default: {os.path.relpath(RESULTS_DIR)}/bench-<time>.json)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before failing (default: 0.2)")
+    parser.add_argument("--min-delta", type=float, default=0.001,
+                        help="ignore timings that changed by fewer seconds than this (default: 0.001)")
+    args = parser.parse_args(argv)
+
+    app_counts = args.apps or (QUICK_APP_COUNTS if args.quick else DEFAULT_APP_COUNTS)
+    sizes = args.sizes if args.sizes is not None else (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+    results = run_benchmarks(app_counts, sizes, with_menu=not args.no_menu, workdir=args.workdir)
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": {name: {"value": value, "unit": unit} for name, (value, unit) in results.items()},
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    write_json_atomic(output, report)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+    print(f"Results written to {output}")
+    if args.save_baseline:
+        write_json_atomic(args.baseline, report)
+        print(f"Saved as the baseline in {args.baseline}")
+    elif not baseline:
+        print("No baseline to compare against; run with --save-baseline to store one.")
+    if regressions:
+        print(f"{len(regressions)} result(s) regressed by more than {args.tolerance:.0%}.", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
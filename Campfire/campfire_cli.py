@@ -0,0 +1,213 @@
+"""
+Command-line entry point for Campfire, for scripts, cron jobs and build machines without a display.
+
+    python campfire_cli.py list DEV
+    python campfire_cli.py push DEV TEST GLIM-CSV Hello
+    python campfire_cli.py request --all
+    python campfire_cli.py approve --all
+    python campfire_cli.py reject Hello
+    python campfire_cli.py run PROD GLIM-CSV
+    python campfire_cli.py stats PROD
+    python campfire_cli.py drift --check
+
+Every command works on the DEV/TEST/PROD directories under --root (default: the current directory).
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+from campfire_core import CampfireEngine, ENVIRONMENTS, drift_status
+
+def resolve_names(engine, environment, args):
+    """The names given on the command line, or every sub-application in the environment with --all."""
+    if args.all:
+        return engine.list_subapplications(environment)
+    if not args.names:
+        raise ValueError("give one or more sub-application names, or --all")
+    return args.names
+
+def cmd_list(engine, args):
+    for name in engine.list_subapplications(args.environment):
+        print(name)
+    return 0
+
+def cmd_push(engine, args):
+    if (args.source, args.target) != ("DEV", "TEST"):
+        raise ValueError("only DEV -> TEST can be pushed directly; use 'request' and 'approve' for TEST -> PROD")
+    names = resolve_names(engine, args.source, args)
+    engine.promote(names, args.source, args.target)
+    print(f"Pushed {len(names)} sub-application(s) from {args.source} to {args.target}.")
+    return 0
+
+def cmd_request(engine, args):
+    added = engine.request_push(resolve_names(engine, "TEST", args))
+    print(f"Submitted {len(added)} new push request(s).")
+    return 0
+
+def cmd_pending(engine, args):
+    for name, requested_at, requested_by in engine.push_requests.pending(since=args.since):
+        timestamp = datetime.datetime.fromtimestamp(requested_at).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"{name}\t{timestamp}\t{requested_by or ''}")
+    return 0
+
+def cmd_approve(engine, args):
+    names = engine.push_requests.pending_names() if args.all else args.names
+    if not names:
+        print("No push requests to approve.")
+        return 0
+    approved, rejected = engine.approve(names)
+    print(f"Approved {len(approved)} push request(s) from TEST to PROD.")
+    if rejected:
+        print(f"Rejected {len(rejected)} request(s) no longer in TEST: {', '.join(rejected)}", file=sys.stderr)
+    skipped = len(names) - len(approved) - len(rejected)
+    if skipped:
+        print(f"Skipped {skipped} request(s) that were not pending.", file=sys.stderr)
+    return 0
+
+def cmd_reject(engine, args):
+    names = engine.push_requests.pending_names() if args.all else args.names
+    if not names:
+        print("No push requests to reject.")
+        return 0
+    rejected = engine.reject(names)
+    print(f"Rejected {len(rejected)} push request(s).")
+    skipped = len(names) - len(rejected)
+    if skipped:
+        print(f"Skipped {skipped} request(s) that were not pending.", file=sys.stderr)
+    return 0
+
+def cmd_remove(engine, args):
+    engine.remove(args.environment, args.names)
+    print(f"Removed {len(args.names)} sub-application(s) from {args.environment}.")
+    return 0
+
+def cmd_run(engine, args):
+    """Run one or more sub-applications concurrently, streaming their output, and wait for them."""
+    prefix = len(args.names) > 1
+    
+    def on_output(run, stream_name, text):
+        stream = sys.stderr if stream_name == "stderr" else sys.stdout
+        stream.write(f"[{run.name}] {text}" if prefix else text)
+        stream.flush()
+    
+    runner = engine.create_runner(on_output=on_output)
+    if args.timeout is not None:
+        runner.timeout = args.timeout
+    runs = []
+    for name in args.names:
+        subapp_path, code_path = engine.prepare_run(args.environment, name)
+        runs.append(runner.submit(args.environment, name, subapp_path, code_path=code_path))
+    
+    while runner.active():
+        try:
+            runner.poll()
+            time.sleep(0.05)
+        except KeyboardInterrupt:
+            runner.shutdown()
+    runner.poll()
+    
+    failed = [run for run in runs if run.status != "finished"]
+    for run in failed:
+        print(f"{run.name}: {run.status} (exit code {run.returncode})", file=sys.stderr)
+    return 1 if failed else 0
+
+def cmd_stats(engine, args):
+    """Recorded run statistics per sub-application, slowest p95 first."""
+    stats = engine.run_history.stats(args.environment)
+    
+    def seconds(value):
+        return "-" if value is None else f"{value:.3f}"
+    
+    print("name\truns\tfailures\tp50_s\tp95_s\tcpu_p50_s\tcpu_p95_s\tpeak_mb")
+    for name, row in sorted(stats.items(), key=lambda item: -(item[1]["wall_p95"] or 0)):
+        peak = "-" if row["peak_memory"] is None else f"{row['peak_memory'] / (1024 * 1024):.1f}"
+        print(f"{name}\t{row['runs']}\t{row['failures']}\t{seconds(row['wall_p50'])}\t{seconds(row['wall_p95'])}\t"
+              f"{seconds(row['cpu_p50'])}\t{seconds(row['cpu_p95'])}\t{peak}")
+    return 0
+
+def cmd_drift(engine, args):
+    """Sub-applications whose normalized content differs between DEV, TEST and PROD, with short hashes."""
+    rows = engine.drift()
+    drifted = 0
+    print("name\t" + "\t".join(ENVIRONMENTS) + "\tstatus")
+    for name, hashes in rows.items():
+        status = drift_status(hashes)
+        if status != "same":
+            drifted += 1
+        elif not args.all:
+            continue
+        print(f"{name}\t" + "\t".join((hashes[environment] or "-")[:12] for environment in ENVIRONMENTS) + f"\t{status}")
+    print(f"{drifted} of {len(rows)} sub-application(s) differ between environments.", file=sys.stderr)
+    return 1 if args.check and drifted else 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="campfire", description="Manage and run Campfire sub-applications without the GUI.")
+    parser.add_argument("--root", default=".", help="directory containing DEV, TEST and PROD (default: current directory)")
+    parser.add_argument("--role", help="role recorded for pushes and approvals (default: your user name)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    list_parser = commands.add_parser("list", help="list the sub-applications in an environment")
+    list_parser.add_argument("environment", choices=ENVIRONMENTS)
+    list_parser.set_defaults(func=cmd_list)
+    
+    push_parser = commands.add_parser("push", help="push sub-applications from DEV to TEST")
+    push_parser.add_argument("source", choices=ENVIRONMENTS)
+    push_parser.add_argument("target", choices=ENVIRONMENTS)
+    push_parser.add_argument("names", nargs="*")
+    push_parser.add_argument("--all", action="store_true", help="push every sub-application in the source")
+    push_parser.set_defaults(func=cmd_push)
+    
+    request_parser = commands.add_parser("request", help="request TEST -> PROD pushes")
+    request_parser.add_argument("names", nargs="*")
+    request_parser.add_argument("--all", action="store_true", help="request every sub-application in TEST")
+    request_parser.set_defaults(func=cmd_request)
+    
+    pending_parser = commands.add_parser("pending", help="list pending push requests, oldest first")
+    pending_parser.add_argument("--since", type=float, help="only requests made after this Unix timestamp")
+    pending_parser.set_defaults(func=cmd_pending)
+    
+    approve_parser = commands.add_parser("approve", help="approve TEST -> PROD push requests")
+    approve_parser.add_argument("names", nargs="*")
+    approve_parser.add_argument("--all", action="store_true", help="approve every pending request")
+    approve_parser.set_defaults(func=cmd_approve)
+    
+    reject_parser = commands.add_parser("reject", help="reject TEST -> PROD push requests")
+    reject_parser.add_argument("names", nargs="*")
+    reject_parser.add_argument("--all", action="store_true", help="reject every pending request")
+    reject_parser.set_defaults(func=cmd_reject)
+    
+    remove_parser = commands.add_parser("remove", help="remove sub-applications from an environment")
+    remove_parser.add_argument("environment", choices=ENVIRONMENTS)
+    remove_parser.add_argument("names", nargs="+")
+    remove_parser.set_defaults(func=cmd_remove)
+    
+    run_parser = commands.add_parser("run", help="run sub-applications and wait for them to finish")
+    run_parser.add_argument("environment", choices=ENVIRONMENTS)
+    run_parser.add_argument("names", nargs="+")
+    run_parser.add_argument("--timeout", type=float, help="seconds before a run is killed")
+    run_parser.set_defaults(func=cmd_run)
+    
+    stats_parser = commands.add_parser("stats", help="show run time and memory statistics per sub-application")
+    stats_parser.add_argument("environment", choices=ENVIRONMENTS)
+    stats_parser.set_defaults(func=cmd_stats)
+    
+    drift_parser = commands.add_parser("drift", help="show sub-applications that differ between DEV, TEST and PROD")
+    drift_parser.add_argument("--all", action="store_true", help="also list sub-applications that are the same everywhere")
+    drift_parser.add_argument("--check", action="store_true", help="exit with status 1 if anything differs")
+    drift_parser.set_defaults(func=cmd_drift)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    os.chdir(args.root)
+    engine = CampfireEngine(user_role=args.role)
+    try:
+        return args.func(engine, args)
+    except (OSError, ValueError) as e:
+        print(f"campfire: {e}", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
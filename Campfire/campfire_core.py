@@ -0,0 +1,1989 @@
+"""
+Headless core of Campfire: environment catalogs, the content-addressed promotion store, the push
+request queue and the out-of-process sub-application runner. Nothing in this module touches
+tkinter, so it is shared by the Tk launcher (Campfire.py) and the command line (campfire_cli.py).
+"""
+import os
+import json
+from array import array  # Compact id lists in the search index
+import hashlib  # For content hashes in the sub-application catalog
+import marshal  # On-disk code objects for the bytecode cache
+import math
+import re
+import sys
+import time
+from collections import OrderedDict  # Submission order of runs
+from itertools import compress
+# Heavier modules (sqlite3, subprocess, queue, threading, concurrent.futures, shutil, datetime) are
+# imported where they are first used, so the launcher's first window does not wait for them.
+
+ENVIRONMENTS = ["DEV", "TEST", "PROD"]
+
+PUSH_REQUESTS_FILE = 'push_requests.json'  # Legacy queue, imported once into PUSH_REQUESTS_DB
+PUSH_REQUESTS_DB = 'push_requests.db'
+CONFIG_FILE = 'config.json'
+STATE_DIR = '.campfire'  # Catalogs and other cached launcher state
+SUBAPP_MANIFEST = 'campfire.json'  # Marks a directory as a package sub-application
+PUSH_HEADER = '#Last push initiated'  # Start of the provenance lines older versions prepended to pushed sources
+
+# Loads a sub-application's code: the cached code object, or the source if the cached file is
+# missing or was written by a different Python version. Shared by the two worker scripts below.
+RUN_LOADER = '''def _campfire_load(code_path, source_path):
+    import marshal
+    from importlib.util import MAGIC_NUMBER
+    try:
+        with open(code_path, 'rb') as f:
+            data = f.read()
+        if data[:len(MAGIC_NUMBER)] == MAGIC_NUMBER:
+            return marshal.loads(data[len(MAGIC_NUMBER):])
+    except (OSError, ValueError, EOFError, TypeError):
+        pass
+    with open(source_path, 'rb') as f:
+        return compile(f.read(), source_path, 'exec')
+'''
+
+# Run in each worker process. The code runs in the real __main__ module with __file__ set, as
+# "python script.py" would, so multiprocessing's spawn start method can re-import the sub-application
+# in its own workers.
+RUN_BOOTSTRAP = 'import sys, os\n\n' + RUN_LOADER + '''
+import __main__
+_campfire_code = _campfire_load(sys.argv[1], sys.argv[2])
+sys.argv = sys.argv[2:3]
+sys.path[0] = os.path.dirname(os.path.abspath(sys.argv[0]))
+__main__.__file__ = sys.argv[0]
+del _campfire_load
+exec(_campfire_code, __main__.__dict__)
+'''
+
+# Run in each WarmPool worker: import the environment's preload modules, print "<token> ready", then
+# run one job per line read from the job pipe. A job runs in a fresh __main__ module; afterwards the
+# modules it imported are dropped and sys.path, the working directory and the environment variables
+# are put back. "<token> <exit code> <CPU seconds> <peak bytes> <retire>" is then written to both
+# stdout and stderr so the launcher knows where the run's output ends. The peak is the run's own,
+# measured by resetting the kernel's high-water mark before the run; where that cannot be done it
+# is reported as 0 (unknown), since the process-wide peak covers every earlier run. The worker
+# exits instead of waiting for another job after max_runs runs, when its peak memory grew by more
+# than max_memory bytes, or when a run left threads running.
+WARM_WORKER = 'import sys, os, json\n\n' + RUN_LOADER + '''
+def _campfire_peak_memory():
+    try:
+        import resource
+    except ImportError:
+        try:
+            import ctypes
+            from ctypes import wintypes
+            class Counters(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("faults", wintypes.DWORD)] + [
+                    (f"size{i}", ctypes.c_size_t) for i in range(8)]  # size0 is PeakWorkingSetSize
+            counters = Counters(cb=ctypes.sizeof(Counters))
+            kernel32 = ctypes.WinDLL("kernel32")
+            kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+            if kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+                return counters.size0
+        except (OSError, AttributeError):
+            pass
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+def _campfire_reset_peak():
+    """Reset the peak resident size on Linux; returns False where it cannot be reset."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def _campfire_run_peak():
+    """Peak resident bytes since _campfire_reset_peak, or 0 if unknown."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+def _campfire_serve(token, job_handle, preload, max_runs, max_memory):
+    import builtins, threading, time, traceback, types
+    for name in preload:
+        try:
+            __import__(name)
+        except Exception as e:
+            print(f"Could not preload {name}: {e}", file=sys.stderr)
+    if os.name == "nt":
+        import msvcrt
+        job_handle = msvcrt.open_osfhandle(job_handle, os.O_RDONLY)
+    jobs = os.fdopen(job_handle, 'r')
+    real_main = sys.modules["__main__"]
+    streams = sys.stdin, sys.stdout, sys.stderr
+    base_modules = set(sys.modules)
+    base_path = list(sys.path)
+    base_cwd = os.getcwd()
+    base_environ = dict(os.environ)
+    base_threads = threading.active_count()
+    base_memory = _campfire_peak_memory()
+    print(token, "ready", flush=True)
+    for runs in range(1, max_runs + 1):
+        line = jobs.readline()
+        if not line:
+            return
+        job = json.loads(line)
+        main = types.ModuleType("__main__")
+        main.__file__ = job["path"]
+        main.__builtins__ = builtins
+        sys.modules["__main__"] = main
+        sys.argv = [job["path"]]
+        sys.path[:] = [os.path.dirname(os.path.abspath(job["path"]))] + base_path[1:]
+        per_run_peak = _campfire_reset_peak()
+        cpu_started = time.process_time()
+        exit_code = 0
+        try:
+            if job["code_path"]:
+                exec(_campfire_load(job["code_path"], job["path"]), main.__dict__)
+            else:  # Zip applications
+                import runpy
+                runpy.run_path(job["path"], run_name="__main__")
+        except SystemExit as e:
+            if isinstance(e.code, int) or e.code is None:
+                exit_code = int(e.code or 0)
+            else:
+                print(e.code, file=sys.stderr)
+                exit_code = 1
+        except BaseException:
+            error_type, error, trace = sys.exc_info()
+            traceback.print_exception(error_type, error, trace.tb_next)  # Without this function's frame
+            exit_code = 1
+        cpu_seconds = time.process_time() - cpu_started
+        sys.stdin, sys.stdout, sys.stderr = streams
+        sys.modules["__main__"] = real_main
+        for name in set(sys.modules) - base_modules:
+            del sys.modules[name]
+        sys.path[:] = base_path
+        os.chdir(base_cwd)
+        os.environ.clear()
+        os.environ.update(base_environ)
+        peak_memory = _campfire_run_peak() if per_run_peak else 0
+        retire = (runs == max_runs or threading.active_count() > base_threads
+                  or bool(max_memory and _campfire_peak_memory() - base_memory > max_memory))
+        status = f"{token} {exit_code} {cpu_seconds:.6f} {peak_memory} {int(retire)}\\n"
+        for stream in (sys.stdout, sys.stderr):
+            stream.write(status)
+            stream.flush()
+        if retire:
+            return
+
+_campfire_serve(sys.argv[1], int(sys.argv[2]), json.loads(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5]))
+'''
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def normalized_hash(path, chunk_size=1024 * 1024):
+    """
+    SHA-256 of a script without the push header lines older versions prepended to it, so a pushed
+    copy hashes the same as the source it was pushed from.
+    """
+    header = PUSH_HEADER.encode("utf-8")
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        line = f.readline()
+        while line.startswith(header):
+            line = f.readline()
+        digest.update(line)
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def parallel_map(func, items, workers):
+    """[func(item) for item in items], spread over a thread pool when there are enough items to be worth it."""
+    if workers <= 1 or len(items) < 16:
+        return [func(item) for item in items]
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(func, items))
+
+def drift_status(hashes):
+    """
+    Summary of one row of CampfireEngine.drift: "same", or which environments hold which version
+    (e.g. "DEV != TEST = PROD") and where it is missing.
+    """
+    groups = {}
+    for environment, content_hash in hashes.items():
+        if content_hash:
+            groups.setdefault(content_hash, []).append(environment)
+    missing = [environment for environment, content_hash in hashes.items() if not content_hash]
+    parts = []
+    if len(groups) > 1:
+        parts.append(" != ".join(" = ".join(environments) for environments in groups.values()))
+    if missing:
+        parts.append(f"missing in {', '.join(missing)}")
+    return "; ".join(parts) or "same"
+
+def write_json_atomic(path, data):
+    """Write JSON to a temp file and rename it over path so readers never see a partial file."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+class FileLock:
+    """
+    Exclusive lock on <path>.lock, held across processes (flock on POSIX, msvcrt on Windows), for
+    read-modify-write updates of state files that several launchers and the command line share.
+    """
+    
+    def __init__(self, path):
+        self.path = path + ".lock"
+        self._file = None
+    
+    def __enter__(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a+b')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                while True:
+                    try:
+                        self._file.seek(0)
+                        msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:  # LK_LOCK gives up after ten seconds; keep waiting
+                        continue
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            self._file.close()
+            raise
+        return self
+    
+    def __exit__(self, *exc_info):
+        if os.name == 'nt':
+            import msvcrt
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()  # Also releases the flock
+
+def remove_empty_parents(path, root):
+    """Remove the directories between path and root (both excluded) that are left empty."""
+    directory = os.path.dirname(path)
+    while directory.startswith(root + os.sep):
+        try:
+            os.rmdir(directory)
+        except OSError:  # Not empty, or already gone
+            return
+        directory = os.path.dirname(directory)
+
+def subapp_kind(entry):
+    """Kind of a catalog entry: "script" (<name>.py), "zipapp" (<name>.pyz) or "package" (<name>/)."""
+    return entry.get("kind", "script")
+
+def tree_hash(files):
+    """Content hash of a package: the hash of its sorted (relative path, file hash) pairs."""
+    digest = hashlib.sha256()
+    for rel_path in sorted(files):
+        digest.update(f"{rel_path}\0{files[rel_path]['hash']}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def entry_hashes(entry):
+    """Content hashes of the files behind a catalog entry: one for a script or zipapp, one per package file."""
+    if subapp_kind(entry) == "package":
+        return {f["hash"] for f in entry["files"].values()}
+    return {entry["hash"]}
+
+_DOCSTRING = re.compile(r'\A(?:[ \t]*(?:#[^\n]*)?\r?\n)*[ \t]*[rRuU]?("{3}|\'{3})(.*?)\1', re.S)
+
+def describe_source(path, limit=16384):
+    """
+    Search metadata from the start of a Python source: {"doc": first paragraph of the module
+    docstring}, plus {"pushes": [...]} holding any push header lines.
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(limit).decode("utf-8", errors="replace")
+    except OSError:
+        return {"doc": ""}
+    match = _DOCSTRING.match(head)
+    doc = " ".join(match.group(2).strip().split("\n\n")[0].split()) if match else ""
+    description = {"doc": doc[:200]}
+    pushes = [line.strip() for line in head.splitlines()[:20] if line.startswith(PUSH_HEADER)]
+    if pushes:
+        description["pushes"] = pushes
+    return description
+
+def _retry_writable(func, path, *args):
+    """Run func(path, ...) again after clearing the read-only attribute Windows gives blob links."""
+    try:
+        return func(path, *args)
+    except PermissionError:
+        if os.name != 'nt':
+            raise
+        import stat
+        os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+        return func(path, *args)
+
+def replace_file(path, destination):
+    """os.replace, also over a read-only destination."""
+    try:
+        os.replace(path, destination)
+    except PermissionError:
+        if os.name != 'nt' or not os.path.exists(destination):
+            raise
+        import stat
+        os.chmod(destination, stat.S_IREAD | stat.S_IWRITE)
+        os.replace(path, destination)
+
+def remove_path(path):
+    """Remove a file or a whole directory tree, if it exists."""
+    if os.path.isdir(path):
+        import shutil
+        shutil.rmtree(path, onerror=lambda func, failed, _: _retry_writable(func, failed))
+    elif os.path.exists(path):
+        _retry_writable(os.remove, path)
+
+class SubappCatalog:
+    """
+    Persistent catalog of the sub-applications in one environment directory.
+    A sub-application is a script (<name>.py), a zipapp (<name>.pyz) or a package: a directory with
+    a campfire.json manifest naming its entry point, e.g. {"entry": "main.py", "exclude": ["*.log"]}.
+    Each entry records size, mtime and content hash, and for packages the same for every file,
+    along with the search metadata from describe_source (read while the file is hashed anyway).
+    A refresh is skipped entirely while the directory mtime is unchanged, and otherwise only
+    re-hashes entries whose stat changed, spread over hash_workers threads. Files inside a package
+    are re-read by refresh_entries, which every push and run goes through. Safe to share between the
+    Tk thread and background file operations.
+    """
+    
+    KINDS = {"package": "{name}", "zipapp": "{name}.pyz", "script": "{name}.py"}  # In order of precedence
+    
+    def __init__(self, directory, state_dir=STATE_DIR, hash_workers=8):
+        import threading
+        self._lock = threading.RLock()
+        self.directory = directory
+        self.hash_workers = hash_workers
+        self.path = os.path.join(state_dir, f"catalog_{directory}.json")
+        self.dir_mtime = None
+        self.entries = {}  # name -> {"size", "mtime", "hash", "doc"}, plus "pushes", "norm", "kind", "entry" and "files"
+        self.icons = {}    # name -> mtime of the optional per-sub-app <name>.png icon
+        self.version = 0   # Bumped whenever entries change, so views can tell cheaply if they are stale
+        self.load()
+    
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                self.dir_mtime = data.get("dir_mtime")
+                self.entries = data.get("entries", {})
+                self.icons = data.get("icons", {})
+            except (OSError, ValueError):
+                # A damaged catalog is just rebuilt on the next refresh.
+                self.dir_mtime = None
+                self.entries = {}
+                self.icons = {}
+    
+    def save(self):
+        write_json_atomic(self.path, {"dir_mtime": self.dir_mtime, "entries": self.entries, "icons": self.icons})
+    
+    def location(self, name, kind="script"):
+        """Path of a sub-application of the given kind in this environment."""
+        return os.path.join(self.directory, self.KINDS[kind].format(name=name))
+    
+    def _directory_mtime(self):
+        try:
+            return os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    @staticmethod
+    def _unchanged(previous, st, kind):
+        return bool(previous and subapp_kind(previous) == kind and "doc" in previous
+                    and previous["size"] == st.st_size and previous["mtime"] == st.st_mtime_ns)
+    
+    def _stat_entry(self, path, st, previous=None, kind="script"):
+        """Build a catalog entry, reusing the previous hash when size and mtime are unchanged."""
+        if self._unchanged(previous, st, kind):
+            return previous
+        entry = {"size": st.st_size, "mtime": st.st_mtime_ns, "hash": hash_file(path)}
+        entry.update(describe_source(path) if kind == "script" else {"doc": ""})
+        if kind != "script":
+            entry["kind"] = kind
+        return entry
+    
+    def _package_entry(self, path, previous=None, known=None):
+        """
+        Build a package entry from its manifest and files. A file's hash is reused from previous
+        when its stat is unchanged, or taken from known (the entry it was just promoted from) when
+        its size matches, so only changed files are read. Raises ValueError for a damaged manifest.
+        """
+        from fnmatch import fnmatch
+        with open(os.path.join(path, SUBAPP_MANIFEST), 'r') as f:
+            manifest = json.load(f)
+        if not isinstance(manifest, dict):
+            raise ValueError(f"{SUBAPP_MANIFEST} in {path} is not a JSON object")
+        exclude = manifest.get("exclude", [])
+        previous_files = previous["files"] if previous and subapp_kind(previous) == "package" else {}
+        known_files = known["files"] if known and subapp_kind(known) == "package" else {}
+        files = {}
+        for root, dirs, filenames in os.walk(path):
+            dirs[:] = [d for d in dirs if d != "__pycache__"]
+            for filename in filenames:
+                file_path = os.path.join(root, filename)
+                rel_path = os.path.relpath(file_path, path).replace(os.sep, "/")
+                if filename.endswith(".pyc") or any(fnmatch(rel_path, pattern) for pattern in exclude):
+                    continue
+                st = os.stat(file_path)
+                old = previous_files.get(rel_path)
+                if old and old["size"] == st.st_size and old["mtime"] == st.st_mtime_ns:
+                    files[rel_path] = old
+                elif rel_path in known_files and known_files[rel_path]["size"] == st.st_size:
+                    files[rel_path] = dict(known_files[rel_path], mtime=st.st_mtime_ns)
+                else:
+                    files[rel_path] = {"size": st.st_size, "mtime": st.st_mtime_ns, "hash": hash_file(file_path)}
+        entry = {
+            "kind": "package",
+            "entry": manifest.get("entry", "__main__.py"),
+            "size": sum(f["size"] for f in files.values()),
+            "mtime": max((f["mtime"] for f in files.values()), default=0),
+            "hash": tree_hash(files),
+            "files": files,
+        }
+        entry.update(describe_source(os.path.join(path, entry["entry"])))
+        return previous if entry == previous else entry
+    
+    def _read_entry(self, name, previous=None, known=None):
+        """Current entry of one sub-application, whatever its kind, or None if it does not exist."""
+        for kind in self.KINDS:
+            path = self.location(name, kind)
+            try:
+                if kind == "package":
+                    if os.path.isfile(os.path.join(path, SUBAPP_MANIFEST)):
+                        return self._package_entry(path, previous, known)
+                    continue
+                return self._stat_entry(path, os.stat(path), previous, kind)
+            except FileNotFoundError:
+                continue
+            except ValueError:
+                return None  # A package with a damaged manifest is not listed
+        return None
+    
+    def refresh(self, force=False):
+        """Bring the catalog up to date with the directory. Returns True if anything changed."""
+        with self._lock:
+            dir_mtime = self._directory_mtime()
+            if dir_mtime is None:
+                changed = bool(self.entries)
+                self.dir_mtime, self.entries, self.icons = None, {}, {}
+                self.version += changed
+                return changed
+            if not force and dir_mtime == self.dir_mtime:
+                return False
+            
+            entries = {}
+            icons = {}
+            stale = []  # (name, path, stat, kind) of scripts and zipapps that have to be hashed
+            kinds = list(self.KINDS)
+            
+            def keep(name, entry):
+                if name not in entries or kinds.index(subapp_kind(entry)) < kinds.index(subapp_kind(entries[name])):
+                    entries[name] = entry
+            
+            with os.scandir(self.directory) as it:
+                for item in it:
+                    name, ext = os.path.splitext(item.name)
+                    try:
+                        if item.is_dir():
+                            if not os.path.isfile(os.path.join(item.path, SUBAPP_MANIFEST)):
+                                continue
+                            name = item.name
+                            previous = self.entries.get(name)
+                            # A listing reuses the last package scan; pushes and runs re-read the files.
+                            if previous and subapp_kind(previous) == "package" and "doc" in previous:
+                                entry = previous
+                            else:
+                                entry = self._package_entry(item.path)
+                        elif ext == ".png":
+                            icons[name] = item.stat().st_mtime_ns
+                            continue
+                        elif ext in (".py", ".pyz"):
+                            kind = "script" if ext == ".py" else "zipapp"
+                            entry = self.entries.get(name)
+                            st = item.stat()
+                            if not self._unchanged(entry, st, kind):
+                                stale.append((name, item.path, st, kind))
+                                continue
+                        else:
+                            continue
+                    except (FileNotFoundError, ValueError):
+                        continue  # Removed while scanning, or a damaged package manifest
+                    keep(name, entry)
+            
+            def hash_stale(item):
+                _, path, st, kind = item
+                try:
+                    return self._stat_entry(path, st, kind=kind)
+                except FileNotFoundError:
+                    return None  # Removed while scanning
+            
+            # hashlib releases the GIL, so a cold scan of thousands of files overlaps its reads.
+            for (name, _, _, _), entry in zip(stale, parallel_map(hash_stale, stale, self.hash_workers)):
+                if entry is not None:
+                    keep(name, entry)
+            changed = entries != self.entries or icons != self.icons
+            self.version += changed
+            self.entries = entries
+            self.icons = icons
+            self.dir_mtime = dir_mtime
+            self.save()
+            return changed
+    
+    def names(self):
+        with self._lock:
+            self.refresh()
+            return sorted(self.entries)
+    
+    def get(self, name):
+        return self.entries.get(name)
+    
+    def snapshot(self):
+        """A copy of the entries, refreshed first; safe to iterate while background pushes update the catalog."""
+        with self._lock:
+            self.refresh()
+            return dict(self.entries)
+    
+    def normalized_hashes(self):
+        """
+        {name: normalized content hash} for every sub-application, with every entry stat'ed again
+        first so in-place edits are caught. This is the content hash, except for scripts carrying push
+        headers: their header-free hash (see normalized_hash) is computed in parallel once per change
+        and kept in the entry as "norm".
+        """
+        entries = self.snapshot()
+        # One stat per script or zipapp at the path the entry says it is at; anything that moved,
+        # changed or is a package (whose files must be walked) goes through refresh_entries.
+        prefix = os.path.join(self.directory, "")
+        restat = []
+        for name, entry in entries.items():
+            kind = subapp_kind(entry)
+            try:
+                st = os.stat(prefix + self.KINDS[kind].format(name=name)) if kind != "package" else None
+            except OSError:
+                st = None
+            if st is None or st.st_size != entry["size"] or st.st_mtime_ns != entry["mtime"]:
+                restat.append(name)
+        if restat:
+            entries.update(self.refresh_entries(restat))
+        pending = [(name, entry) for name, entry in entries.items()
+                   if entry is not None and "pushes" in entry and "norm" not in entry and subapp_kind(entry) == "script"]
+        
+        def hash_pending(item):
+            try:
+                return normalized_hash(self.location(item[0]))
+            except FileNotFoundError:
+                return None
+        
+        if pending:
+            computed = parallel_map(hash_pending, pending, self.hash_workers)
+            with self._lock:
+                changed = False
+                for (name, entry), norm in zip(pending, computed):
+                    if norm is not None and self.entries.get(name) is entry:  # Not rewritten meanwhile
+                        entries[name] = self.entries[name] = dict(entry, norm=norm)
+                        changed = True
+                if changed:
+                    self.version += 1
+                    self.save()
+        return {name: entry.get("norm", entry["hash"]) for name, entry in entries.items() if entry is not None}
+    
+    def icon_for(self, name):
+        """Return (path, mtime) of the sub-application's own icon, or None if it has none."""
+        if name in self.icons:
+            return os.path.join(self.directory, f"{name}.png"), self.icons[name]
+        return None
+    
+    def refresh_entries(self, names):
+        """Re-stat specific sub-applications (catching in-place edits) and return {name: entry or None}."""
+        with self._lock:
+            result = {}
+            changed = False
+            for name in names:
+                previous = self.entries.get(name)
+                entry = self._read_entry(name, previous)
+                if entry is not previous:
+                    changed = True
+                    if entry is None:
+                        self.entries.pop(name, None)
+                    else:
+                        self.entries[name] = entry
+                result[name] = entry
+            if changed:
+                self.version += 1
+                self.save()
+            return result
+    
+    def refresh_entry(self, name):
+        return self.refresh_entries([name])[name]
+    
+    def update_entry(self, name, content_hash=None):
+        """
+        Record a single sub-application that was just written, without rescanning the directory.
+        When the caller already knows the content hash (e.g. a blob-store promotion) it is not recomputed.
+        """
+        with self._lock:
+            if content_hash is None:
+                self.refresh_entry(name)
+                self.dir_mtime = self._directory_mtime()
+                self.save()
+            else:
+                self.update_entries({name: content_hash})
+    
+    def update_entries(self, hashes, sources=None):
+        """
+        Record several just-written sub-applications ({name: content hash}) with a single save.
+        sources maps names to the entries they were promoted from; it gives the kind, and for
+        packages the file hashes, so nothing has to be read again.
+        """
+        with self._lock:
+            for name, content_hash in hashes.items():
+                source = (sources or {}).get(name) or {}
+                kind = subapp_kind(source)
+                if kind == "package":
+                    self.entries[name] = self._package_entry(self.location(name, kind), self.entries.get(name), source)
+                    continue
+                st = os.stat(self.location(name, kind))
+                self.entries[name] = {"size": st.st_size, "mtime": st.st_mtime_ns, "hash": content_hash}
+                self.entries[name].update((key, source[key]) for key in ("doc", "pushes") if key in source)
+                if "norm" in source and source["hash"] == content_hash:
+                    self.entries[name]["norm"] = source["norm"]
+                if kind != "script":
+                    self.entries[name]["kind"] = kind
+            self.version += 1
+            self.dir_mtime = self._directory_mtime()
+            self.save()
+    
+    def remove_entry(self, name):
+        """Forget a single sub-application that was just removed, without rescanning the directory."""
+        self.remove_entries([name])
+    
+    def remove_entries(self, names):
+        with self._lock:
+            for name in names:
+                self.entries.pop(name, None)
+            self.version += 1
+            self.dir_mtime = self._directory_mtime()
+            self.save()
+
+class BlobStore:
+    """
+    Content-addressed store for promoted sub-applications, one file per SHA-256 hash.
+    TEST and PROD files are hardlinks to blobs (or copies where the filesystem has no hardlinks),
+    so promoting identical content between environments never duplicates or rewrites it.
+    Blobs are made read-only, and the size and mtime of each blob as stored are kept in
+    index.json: an environment file edited in place anyway (it is the same inode as its blob)
+    shows up as a changed stat, and the blob is re-hashed before it is reused. A blob whose link
+    count dropped back to 1 after its environment files were replaced or removed is deleted.
+    """
+    
+    def __init__(self, blob_dir=os.path.join(STATE_DIR, "blobs")):
+        import threading
+        self._lock = threading.Lock()
+        self.blob_dir = blob_dir
+        self.index_path = os.path.join(blob_dir, "index.json")
+        self._stats = None  # hash -> [size, mtime] of the blob as stored, loaded on first use
+        self._dirty = False
+    
+    def path(self, content_hash):
+        return os.path.join(self.blob_dir, content_hash[:2], content_hash)
+    
+    def _index(self):
+        with self._lock:
+            if self._stats is None:
+                try:
+                    with open(self.index_path, 'r') as f:
+                        self._stats = json.load(f)
+                except (OSError, ValueError):
+                    self._stats = {}  # A lost index only means blobs are re-hashed once
+            return self._stats
+    
+    def _record(self, content_hash, st=None):
+        stats = self._index()
+        with self._lock:
+            if st is None:
+                stats.pop(content_hash, None)
+            else:
+                stats[content_hash] = [st.st_size, st.st_mtime_ns]
+            self._dirty = True
+    
+    def save(self):
+        """Write the blob index if it changed; promote calls this once per batch."""
+        with self._lock:
+            if not self._dirty:
+                return
+            write_json_atomic(self.index_path, self._stats)
+            self._dirty = False
+    
+    def has(self, content_hash):
+        """
+        Whether the store holds an intact blob for content_hash. A blob whose stat changed since it
+        was stored is re-hashed, and discarded if its content no longer matches its name.
+        """
+        blob_path = self.path(content_hash)
+        try:
+            st = os.stat(blob_path)
+        except FileNotFoundError:
+            return False
+        if self._index().get(content_hash) == [st.st_size, st.st_mtime_ns]:
+            return True
+        if hash_file(blob_path) == content_hash:
+            self._record(content_hash, st)
+            return True
+        # The edited file keeps the inode; the store forgets it and takes the content again.
+        remove_path(blob_path)
+        self._record(content_hash, None)
+        return False
+    
+    def put_file(self, source_path):
+        """Copy a file into the store, hashing it on the way in, and return its hash."""
+        import stat
+        import threading
+        os.makedirs(self.blob_dir, exist_ok=True)
+        tmp_path = os.path.join(self.blob_dir, f"incoming.tmp{os.getpid()}-{threading.get_ident()}")
+        digest = hashlib.sha256()
+        with open(source_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                digest.update(chunk)
+                dst.write(chunk)
+        content_hash = digest.hexdigest()
+        if self.has(content_hash):
+            os.remove(tmp_path)
+        else:
+            blob_path = self.path(content_hash)
+            os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.replace(tmp_path, blob_path)
+            self._record(content_hash, os.stat(blob_path))
+        return content_hash
+    
+    def release(self, content_hashes):
+        """Delete the blobs for content_hashes that no environment file links to any more."""
+        for content_hash in content_hashes:
+            blob_path = self.path(content_hash)
+            try:
+                if os.stat(blob_path).st_nlink > 1:
+                    continue
+            except FileNotFoundError:
+                continue
+            remove_path(blob_path)
+            self._record(content_hash, None)
+    
+    def stage_link(self, content_hash, destination):
+        """Create a hardlink (or a copy as a fallback) to a blob next to destination and return its path."""
+        tmp_path = f"{destination}.tmp{os.getpid()}"
+        try:
+            os.link(self.path(content_hash), tmp_path)
+        except OSError:
+            import shutil
+            shutil.copyfile(self.path(content_hash), tmp_path)
+        return tmp_path
+    
+    def link(self, content_hash, destination):
+        """Point destination at a blob, replacing it atomically."""
+        replace_file(self.stage_link(content_hash, destination), destination)
+
+class ProvenanceStore:
+    """
+    Push history of the sub-applications in one environment, newest first.
+    This replaces the '#Last push initiated...' headers that used to be prepended to the source.
+    Other launchers and the command line write the same file, so it is re-read whenever its stat
+    changed, and every update re-reads and merges under a FileLock before writing it back.
+    """
+    
+    def __init__(self, directory, state_dir=STATE_DIR):
+        import threading
+        self._lock = threading.RLock()
+        self.path = os.path.join(state_dir, f"provenance_{directory}.json")
+        self.records = {}  # Replaced, never changed in place, so a snapshot stays consistent
+        self._stat = None  # (inode, size, mtime) of the file self.records was read from
+        self._reload()
+    
+    def _reload(self):
+        """Re-read the file if it was rewritten since it was last read."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self.records, self._stat = {}, None
+            return
+        key = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if key != self._stat:
+            with open(self.path, 'r') as f:
+                self.records = json.load(f)
+            self._stat = key
+    
+    def _update(self, change):
+        """Apply change(records copy) to the current file contents and write them back, under the file lock."""
+        with self._lock, FileLock(self.path):
+            self._reload()
+            records = dict(self.records)
+            if change(records):
+                write_json_atomic(self.path, records)
+                st = os.stat(self.path)
+                self.records, self._stat = records, (st.st_ino, st.st_size, st.st_mtime_ns)
+    
+    def snapshot(self):
+        """{name: [records]} as currently on disk."""
+        with self._lock:
+            self._reload()
+            return self.records
+    
+    def history(self, name):
+        return self.snapshot().get(name, [])
+    
+    def record(self, name, record, previous=()):
+        self.record_many({name: (record, previous)})
+    
+    def record_many(self, records):
+        """Record several pushes ({name: (record, previous history)}) with a single write."""
+        def change(current):
+            for name, (record, previous) in records.items():
+                current[name] = [record] + list(previous)
+            return bool(records)
+        self._update(change)
+    
+    def forget(self, name):
+        self.forget_many([name])
+    
+    def forget_many(self, names):
+        self._update(lambda current: [name for name in names if current.pop(name, None) is not None])
+
+_WORD = re.compile(r"\w+")
+
+class SubappSearchIndex:
+    """
+    In-memory search over one environment's sub-applications: names, docstring summaries, push header
+    lines and the latest provenance record. Built once, then kept current by sync(), which re-indexes
+    only the entries whose catalog entry or latest provenance record changed.
+    Common keys are int bitmasks over entry ids, so a query is a few ANDs however many entries match;
+    rare keys are id arrays, turned into masks when a query uses them, which keeps memory down. Ids
+    are assigned in name order so matches come out sorted. Terms of three or more characters match
+    anywhere (trigram masks, confirmed as substrings when longer); shorter terms match the start of a
+    word. Names matching every term come first. sync() may run on a background thread, but not while
+    search() runs.
+    """
+    
+    _SELECT = bytes.maketrans(b"01", b"\0\1")
+    
+    def __init__(self):
+        import threading
+        self._lock = threading.Lock()  # Serialises sync()
+        self.ids = {}           # name -> id
+        self.names_by_id = []   # id -> name, or None once removed
+        self.texts_by_id = []   # id -> lowercase searchable text
+        self.sources = {}       # name -> (catalog entry, latest provenance record) it was indexed from
+        self.grams = {}         # key (see _keys) of the text -> posting (mask or id array)
+        self.name_grams = {}    # key of the name alone -> posting
+        self.live = 0           # Mask of the ids in use
+        self.appended = 0       # Ids added out of name order since the last rebuild
+        self.removed = 0        # Ids retired since the last rebuild
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def sync(self, entries, provenance=None):
+        """Bring the index up to date with {name: catalog entry} and {name: [provenance records]}."""
+        with self._lock:
+            self._sync(entries, provenance or {})
+    
+    def _sync(self, entries, provenance):
+        current = {}
+        changed = []
+        for name, entry in entries.items():
+            history = provenance.get(name)
+            latest = history[0] if history else None
+            current[name] = (entry, latest)
+            old = self.sources.get(name)
+            if old is None or old[0] is not entry or old[1] is not latest:  # Catalogs reuse unchanged entries
+                changed.append(name)
+        removed = [name for name in self.sources if name not in current]
+        if not changed and not removed:
+            return
+        if len(changed) + len(removed) + self.appended + self.removed > max(64, len(current) // 8):
+            self._rebuild(current)
+            return
+        for name in removed + changed:
+            if name in self.ids:
+                self._remove(name)
+        for name in changed:
+            self._add(name, *current[name])
+    
+    @staticmethod
+    def _text(name, entry, latest):
+        parts = [name, entry.get("doc", "")] + entry.get("pushes", [])
+        if latest:
+            parts.append(f"pushed by {latest.get('pushed_by') or ''} {latest.get('route', '')} {latest.get('pushed_at', '')}")
+        return "\n".join(parts).lower()
+    
+    @staticmethod
+    def _keys(text):
+        """Trigrams of the text, and the one- and two-character prefixes of its words."""
+        keys = {text[i:i + 3] for i in range(len(text) - 2)}
+        for word in _WORD.findall(text):
+            keys.add(word[:1])
+            keys.add(word[:2])
+        return keys
+    
+    @staticmethod
+    def _mask(posting):
+        """A posting as a bitmask."""
+        if posting is None:
+            return 0
+        if isinstance(posting, int):
+            return posting
+        bits = bytearray(max(posting) // 8 + 1)
+        for i in posting:
+            bits[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(bits, "little")
+    
+    @classmethod
+    def _postings(cls, ids_by_key, total):
+        """{key: [id, ...]} as postings: a mask once an array would be larger (more than 1 id in 32)."""
+        return {key: cls._mask(ids) if len(ids) * 32 > total else array("I", ids) for key, ids in ids_by_key.items()}
+    
+    def _rebuild(self, current):
+        """Re-index everything, with ids in name order."""
+        names = sorted(current)
+        self.ids = {name: i for i, name in enumerate(names)}
+        self.names_by_id = names
+        self.texts_by_id = [self._text(name, *current[name]) for name in names]
+        self.sources = current
+        self.live = (1 << len(names)) - 1
+        self.appended = self.removed = 0
+        grams = {}
+        name_grams = {}
+        for i, (name, text) in enumerate(zip(names, self.texts_by_id)):
+            for key in self._keys(text):
+                grams.setdefault(key, []).append(i)
+            for key in self._keys(name.lower()):
+                name_grams.setdefault(key, []).append(i)
+        self.grams = self._postings(grams, len(names))
+        self.name_grams = self._postings(name_grams, len(names))
+    
+    def _add(self, name, entry, latest):
+        i = len(self.names_by_id)
+        text = self._text(name, entry, latest)
+        self.ids[name] = i
+        self.names_by_id.append(name)
+        self.texts_by_id.append(text)
+        self.sources[name] = (entry, latest)
+        self.live |= 1 << i
+        self.appended += 1
+        for postings, keys in ((self.grams, self._keys(text)), (self.name_grams, self._keys(name.lower()))):
+            for key in keys:
+                posting = postings.get(key)
+                if posting is None:
+                    postings[key] = array("I", (i,))
+                elif isinstance(posting, int):
+                    postings[key] = posting | 1 << i
+                else:
+                    posting.append(i)
+                    if len(posting) * 32 > i:
+                        postings[key] = self._mask(posting)
+    
+    def _remove(self, name):
+        i = self.ids.pop(name)
+        del self.sources[name]
+        self.names_by_id[i] = None
+        self.live &= ~(1 << i)
+        self.removed += 1
+        # Stale ids in the postings are harmless: every query is ANDed with self.live.
+    
+    def _select(self, mask):
+        """[names], [texts] of the ids set in mask, in id order."""
+        selectors = format(mask, "b")[::-1].encode("ascii").translate(self._SELECT) if mask else b""
+        return list(compress(self.names_by_id, selectors)), list(compress(self.texts_by_id, selectors))
+    
+    def search(self, query):
+        """Names matching every whitespace-separated term of the query, best matches first."""
+        terms = [term for term in query.lower().split() if len(term) >= 3 or _WORD.fullmatch(term)]
+        match = in_name = self.live
+        for term in terms:
+            if len(term) < 3:
+                match &= self._mask(self.grams.get(term))
+                in_name &= self._mask(self.name_grams.get(term))
+                continue
+            for j in range(len(term) - 2):
+                match &= self._mask(self.grams.get(term[j:j + 3]))
+                in_name &= self._mask(self.name_grams.get(term[j:j + 3]))
+            if not match:
+                return []
+        long_terms = [term for term in terms if len(term) > 3]  # Trigram masks only prove shorter terms
+        groups = []
+        for mask in (match & in_name, match & ~in_name):
+            names, texts = self._select(mask)
+            for term in long_terms:
+                keep = [term in text for text in texts]
+                names = list(compress(names, keep))
+                texts = list(compress(texts, keep))
+            groups.append(names)
+        in_name, elsewhere = groups
+        if long_terms:  # Names holding every trigram of a term but not the term itself
+            keep = [all(term in name.lower() for term in long_terms) for name in in_name]
+            if not all(keep):
+                elsewhere += list(compress(in_name, [not k for k in keep]))
+                in_name = list(compress(in_name, keep))
+                elsewhere.sort()
+        if self.appended:
+            in_name.sort()
+            elsewhere.sort()
+        return in_name + elsewhere
+
+class PushRequestStore:
+    """
+    TEST -> PROD push requests in SQLite, one row per sub-application name.
+    The primary key makes duplicate checks O(1) and the (status, requested_at) index serves
+    "pending since" queries. Writers take SQLite's file lock with BEGIN IMMEDIATE, so several users
+    sharing the database cannot overwrite each other's changes; approvals first claim their rows so
+    two managers never approve the same request twice. A claim is a lease: a row still 'approving'
+    claim_lease seconds after it was claimed (its approver crashed or was killed) counts as pending
+    again. The default rollback journal is kept because WAL mode does not work on network shares.
+    """
+    
+    def __init__(self, path=PUSH_REQUESTS_DB, legacy_path=PUSH_REQUESTS_FILE, claim_lease=3600):
+        import sqlite3
+        import threading
+        is_new = not os.path.exists(path)
+        self.claim_lease = claim_lease
+        # One connection shared by the Tk thread and background operations, one statement at a time.
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS push_requests (
+            name TEXT PRIMARY KEY,
+            status TEXT NOT NULL,          -- pending, approving, approved, rejected
+            requested_at REAL NOT NULL,
+            requested_by TEXT,
+            decided_at REAL,
+            decided_by TEXT)""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS push_requests_status ON push_requests (status, requested_at)")
+        if is_new and legacy_path and os.path.exists(legacy_path):
+            with open(legacy_path, 'r') as f:
+                self.add_many(json.load(f), None)
+    
+    def _write(self, sql, names, **params):
+        """Run sql once per name inside a single locked transaction; return the names whose row changed."""
+        with self._lock:
+            changed = []
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for name in names:
+                    if self.conn.execute(sql, dict(params, name=name)).rowcount:
+                        changed.append(name)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            return changed
+    
+    def add(self, name, requested_by):
+        """Add a pending request; returns False if one is already pending for this name."""
+        return bool(self.add_many([name], requested_by))
+    
+    def add_many(self, names, requested_by):
+        """Add pending requests for several names in one transaction; returns the names actually added."""
+        return self._write(
+            """INSERT INTO push_requests (name, status, requested_at, requested_by) VALUES (:name, 'pending', :now, :by)
+               ON CONFLICT (name) DO UPDATE SET status = 'pending', requested_at = excluded.requested_at,
+                   requested_by = excluded.requested_by, decided_at = NULL, decided_by = NULL
+               WHERE status IN ('approved', 'rejected') OR (status = 'approving' AND decided_at < :expired)""",
+            names, now=time.time(), by=requested_by, expired=self._expired())
+    
+    def _expired(self):
+        """Claims made before this time have outlived their lease."""
+        return time.time() - self.claim_lease
+    
+    def pending(self, since=None):
+        """Pending requests as (name, requested_at, requested_by), oldest first, optionally only those after since."""
+        with self._lock:
+            sql = ("SELECT name, requested_at, requested_by FROM push_requests "
+                   "WHERE (status = 'pending' OR (status = 'approving' AND decided_at < ?))")
+            params = (self._expired(),)
+            if since is not None:
+                sql += " AND requested_at >= ?"
+                params += (since,)
+            return self.conn.execute(sql + " ORDER BY requested_at, name", params).fetchall()
+    
+    def pending_names(self):
+        return [row[0] for row in self.pending()]
+    
+    def claim(self, names, decided_by):
+        """Mark pending requests (or expired claims) as being approved; returns the names this caller now owns."""
+        return self._write("UPDATE push_requests SET status = 'approving', decided_at = :now, decided_by = :by "
+                           "WHERE name = :name AND (status = 'pending' OR (status = 'approving' AND decided_at < :expired))",
+                           names, now=time.time(), by=decided_by, expired=self._expired())
+    
+    def complete(self, names):
+        self._write("UPDATE push_requests SET status = 'approved' WHERE name = :name AND status = 'approving'", names)
+    
+    def release(self, names):
+        """Return claimed requests to the queue after a failed approval."""
+        self._write("UPDATE push_requests SET status = 'pending', decided_at = NULL, decided_by = NULL "
+                    "WHERE name = :name AND status = 'approving'", names)
+    
+    def reject(self, names, decided_by):
+        """Reject pending requests (or expired claims); returns the names rejected. They can be requested again."""
+        return self._write("UPDATE push_requests SET status = 'rejected', decided_at = :now, decided_by = :by "
+                           "WHERE name = :name AND (status = 'pending' OR (status = 'approving' AND decided_at < :expired))",
+                           names, now=time.time(), by=decided_by, expired=self._expired())
+    
+    def withdraw(self, names):
+        """Drop pending requests, e.g. because the sub-application left TEST; returns the names dropped."""
+        return self._write("DELETE FROM push_requests WHERE name = :name "
+                           "AND (status = 'pending' OR (status = 'approving' AND decided_at < :expired))",
+                           names, expired=self._expired())
+
+class BytecodeCache:
+    """
+    Compiled sub-application code keyed by (environment, name, content hash), marshalled to
+    .pyc-style files on disk, so a sub-application is only compiled again after its contents change.
+    Runs load the files out of process, so only the hash each file was written for is remembered
+    here. Writing a new version deletes the sub-application's older files.
+    """
+    
+    def __init__(self, cache_dir=os.path.join(STATE_DIR, "bytecode")):
+        import threading
+        self._lock = threading.RLock()
+        self.cache_dir = cache_dir
+        self._current = {}  # (environment, name) -> content hash of its code file known to be current
+    
+    def code_path(self, environment, name, content_hash):
+        return os.path.join(self.cache_dir, environment, f"{name}.{content_hash}.pyc")
+    
+    def get(self, environment, name, source_path, content_hash):
+        """
+        Return the path of a cached code file for the sub-application, compiling it if needed.
+        Returns None if the source does not compile; the worker then reports the error itself.
+        """
+        with self._lock:
+            key = (environment, name)
+            code_path = self.code_path(environment, name, content_hash)
+            if self._current.get(key) == content_hash:
+                return code_path
+            
+            if not self._is_current(code_path):
+                try:
+                    with open(source_path, 'rb') as f:
+                        code = compile(f.read(), source_path, 'exec')
+                except (OSError, SyntaxError, ValueError):
+                    return None
+                self._store(code_path, code)
+                self._remove_files(environment, {name}, keep=code_path)
+            self._current[key] = content_hash
+            return code_path
+    
+    def _is_current(self, code_path):
+        """Whether code_path exists and was written by this Python version."""
+        from importlib.util import MAGIC_NUMBER
+        try:
+            with open(code_path, 'rb') as f:
+                return f.read(len(MAGIC_NUMBER)) == MAGIC_NUMBER
+        except OSError:
+            return False
+    
+    def _store(self, code_path, code):
+        from importlib.util import MAGIC_NUMBER
+        os.makedirs(os.path.dirname(code_path), exist_ok=True)
+        tmp_path = f"{code_path}.tmp{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC_NUMBER + marshal.dumps(code))
+        os.replace(tmp_path, code_path)
+    
+    def _remove_files(self, environment, names, keep=None):
+        """Delete the code files of the named sub-applications in an environment, except keep."""
+        directory = os.path.join(self.cache_dir, environment)
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if (entry.name.endswith(".pyc") and entry.name.rsplit(".", 2)[0] in names
+                            and entry.path != keep):
+                        try:
+                            os.remove(entry.path)
+                        except OSError:  # Being read by a run on Windows; removed with the next version
+                            pass
+        except FileNotFoundError:
+            pass
+    
+    def invalidate(self, environment, name):
+        """Drop every cached version of a sub-application, e.g. after a push rewrote it."""
+        self.invalidate_many(environment, [name])
+    
+    def invalidate_many(self, environment, names):
+        with self._lock:
+            names = set(names)
+            for name in names:
+                self._current.pop((environment, name), None)
+            self._remove_files(environment, names)
+
+def _windows_usage(process):
+    """(CPU seconds, peak working set in bytes) of an exited Windows process, from its still-open handle."""
+    import ctypes
+    from ctypes import wintypes
+    
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+            (field, ctypes.c_size_t) for field in (
+                "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+    
+    kernel32 = ctypes.WinDLL("kernel32")
+    handle = wintypes.HANDLE(int(process._handle))
+    cpu_seconds = peak_memory = None
+    times = [wintypes.FILETIME() for _ in range(4)]  # creation, exit, kernel, user
+    if kernel32.GetProcessTimes(handle, *(ctypes.byref(t) for t in times)):
+        cpu_seconds = sum((t.dwHighDateTime << 32 | t.dwLowDateTime) for t in times[2:]) / 1e7
+    counters = PROCESS_MEMORY_COUNTERS(cb=ctypes.sizeof(PROCESS_MEMORY_COUNTERS))
+    if kernel32.K32GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+        peak_memory = counters.PeakWorkingSetSize
+    return cpu_seconds, peak_memory
+
+def wait_for_process(process):
+    """
+    Block until a Popen process exits; returns (exit code, CPU seconds, peak memory in bytes).
+    POSIX reads the child's rusage with wait4; Windows queries the process handle. Usage that cannot
+    be measured is None.
+    """
+    if hasattr(os, "wait4"):
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+        except ChildProcessError:  # Reaped elsewhere, e.g. by a kill() racing with this wait
+            return process.wait(), None, None
+        process.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+        peak_memory = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        return process.returncode, usage.ru_utime + usage.ru_stime, peak_memory
+    returncode = process.wait()
+    try:
+        return (returncode,) + _windows_usage(process)
+    except (OSError, AttributeError):
+        return returncode, None, None
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+class RunHistory:
+    """
+    Append-only log of finished runs, one tab-separated line per run in .campfire/runs_<ENV>.log:
+    end time, name, status, exit code, wall seconds, CPU seconds and peak memory in bytes.
+    Appends are a single small write, so several launchers can share a log. Stats are cached and
+    only the lines appended since the last read are parsed.
+    """
+    
+    FIELDS = ("ended_at", "name", "status", "returncode", "wall", "cpu", "peak_memory")
+    
+    def __init__(self, state_dir=STATE_DIR):
+        self.state_dir = state_dir
+        self._records = {}  # environment -> (bytes read, [record, ...])
+    
+    def path(self, environment):
+        return os.path.join(self.state_dir, f"runs_{environment}.log")
+    
+    def record(self, run):
+        """Append a finished run; runs that never started are not recorded."""
+        if run.started is None:
+            return
+        values = (f"{time.time():.3f}", run.name, run.status, run.returncode,
+                  f"{run.wall_seconds:.4f}" if run.wall_seconds is not None else None,
+                  f"{run.cpu_seconds:.4f}" if run.cpu_seconds is not None else None, run.peak_memory)
+        line = "\t".join("" if value is None else str(value) for value in values) + "\n"
+        os.makedirs(self.state_dir, exist_ok=True)
+        with open(self.path(run.environment), 'a') as f:
+            f.write(line)
+    
+    def records(self, environment):
+        """Every recorded run of an environment as dicts, oldest first."""
+        offset, records = self._records.get(environment, (0, []))
+        try:
+            with open(self.path(environment), 'rb') as f:
+                if os.fstat(f.fileno()).st_size < offset:  # The log was truncated or replaced
+                    offset, records = 0, []
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        complete = data.rfind(b"\n") + 1  # Leave a line still being written for the next read
+        for line in data[:complete].decode("utf-8", errors="replace").splitlines():
+            values = line.split("\t")
+            if len(values) != len(self.FIELDS):
+                continue
+            record = dict(zip(self.FIELDS, values))
+            for field, convert in (("ended_at", float), ("returncode", int), ("wall", float),
+                                   ("cpu", float), ("peak_memory", int)):
+                record[field] = convert(record[field]) if record[field] else None
+            records.append(record)
+        self._records[environment] = (offset + complete, records)
+        return records
+    
+    def stats(self, environment):
+        """
+        Per sub-application: run and failure counts, p50/p95 wall and CPU time of runs that exited on
+        their own (finished or failed) and the largest peak memory seen.
+        """
+        by_name = {}
+        for record in self.records(environment):
+            by_name.setdefault(record["name"], []).append(record)
+        stats = {}
+        for name, records in by_name.items():
+            exited = [r for r in records if r["status"] in ("finished", "failed")]
+            walls = sorted(r["wall"] for r in exited if r["wall"] is not None)
+            cpus = sorted(r["cpu"] for r in exited if r["cpu"] is not None)
+            peaks = [r["peak_memory"] for r in records if r["peak_memory"] is not None]
+            stats[name] = {
+                "runs": len(records),
+                "failures": sum(r["status"] != "finished" for r in records),
+                "wall_p50": percentile(walls, 0.5) if walls else None,
+                "wall_p95": percentile(walls, 0.95) if walls else None,
+                "cpu_p50": percentile(cpus, 0.5) if cpus else None,
+                "cpu_p95": percentile(cpus, 0.95) if cpus else None,
+                "peak_memory": max(peaks) if peaks else None,
+                "last_run": records[-1]["ended_at"],
+            }
+        return stats
+
+class SubappRun:
+    """State of one sub-application run submitted to the SubappRunner."""
+    
+    def __init__(self, run_id, environment, name, path, timeout, code_path=None):
+        self.run_id = run_id
+        self.environment = environment
+        self.name = name
+        self.path = path
+        self.code_path = code_path  # Cached bytecode to execute instead of compiling path
+        self.timeout = timeout
+        self.status = "queued"  # queued, running, finished, failed, timed out, cancelled
+        self.returncode = None
+        self.process = None
+        self.started = None
+        self.ended = None
+        self.wall_seconds = None  # Measured when the process exits, with its CPU time and peak memory
+        self.cpu_seconds = None
+        self.peak_memory = None
+        self.output = []        # [(stream, text), ...]
+        self.open_streams = 0
+
+class WarmWorker:
+    """A WarmPool interpreter: its process, the pipe jobs are written to and the run it is executing."""
+    
+    def __init__(self, environment, process, jobs, token):
+        self.environment = environment
+        self.process = process
+        self.jobs = jobs
+        self.token = token  # Prefix of the worker's "ready" and end-of-run lines
+        self.ready = False  # Set once the preload imports are done
+        self.run = None
+        self.retire = False  # Set by the stderr reader when the worker exits after the current run
+    
+    def dispatch(self, run):
+        self.run = run
+        self.jobs.write(json.dumps({"path": run.path, "code_path": run.code_path}) + "\n")
+        self.jobs.flush()
+
+class WarmPool:
+    """
+    Interpreters started ahead of time with an environment's preload modules already imported, so a
+    run skips interpreter start-up and those imports. Each worker runs one sub-application at a time
+    (see WARM_WORKER) and exits after max_runs runs, after its memory grew by more than max_memory_mb,
+    or after a run left threads behind. `workers` idle workers are kept per warmed environment.
+    Cancelling or timing out a run kills its worker. The SubappRunner owns the pool: reader threads
+    post to the runner's event queue and the runner's poll() calls handle_event() and release().
+    """
+    
+    def __init__(self, events, workers=1, preload=None, max_runs=20, max_memory_mb=None):
+        self.events = events
+        self.size = workers
+        self.preload = preload or {}  # environment -> [module name, ...]
+        self.max_runs = max(1, max_runs)
+        self.max_memory = int(max_memory_mb * 1024 * 1024) if max_memory_mb else 0
+        self.workers = []
+        self.environments = set()  # Environments to keep warm
+    
+    def warm(self, environment):
+        """Start keeping workers ready for an environment."""
+        self.environments.add(environment)
+        self.top_up()
+    
+    def take(self, environment):
+        """An idle worker for the environment, or None if none has finished starting yet."""
+        self.warm(environment)
+        for worker in self.workers:
+            if worker.environment == environment and worker.ready and worker.run is None:
+                return worker
+        return None
+    
+    def top_up(self):
+        for environment in self.environments:
+            idle = sum(1 for worker in self.workers if worker.environment == environment and worker.run is None)
+            for _ in range(self.size - idle):
+                try:
+                    self.workers.append(self._start(environment))
+                except OSError:
+                    return  # Runs fall back to fresh processes
+    
+    def _start(self, environment):
+        import secrets
+        import subprocess
+        import threading
+        token = f"#campfire-{secrets.token_hex(8)}"
+        read_fd, write_fd = os.pipe()  # Jobs go over their own pipe so the worker's stdin stays the launcher's
+        options = {}
+        if os.name == "nt":
+            import msvcrt
+            job_handle = msvcrt.get_osfhandle(read_fd)
+            os.set_handle_inheritable(job_handle, True)
+            options["startupinfo"] = subprocess.STARTUPINFO(lpAttributeList={"handle_list": [job_handle]})
+        else:
+            job_handle = read_fd
+            options["pass_fds"] = (read_fd,)
+        try:
+            process = subprocess.Popen(
+                [sys.executable, "-u", "-c", WARM_WORKER, token, str(job_handle),
+                 json.dumps(self.preload.get(environment, [])), str(self.max_runs), str(self.max_memory)],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors="replace", bufsize=1, **options)
+        except OSError:
+            os.close(write_fd)
+            raise
+        finally:
+            os.close(read_fd)
+        worker = WarmWorker(environment, process, os.fdopen(write_fd, 'w'), token)
+        for stream_name, stream in (("stdout", process.stdout), ("stderr", process.stderr)):
+            threading.Thread(target=self._read_stream, args=(worker, stream_name, stream), daemon=True).start()
+        threading.Thread(target=self._wait_process, args=(worker,), daemon=True).start()
+        return worker
+    
+    def _read_stream(self, worker, stream_name, stream):
+        # worker.run only changes on the runner's thread once both streams have posted the run's end,
+        # so reading it here always names the run the line belongs to.
+        ended = None
+        for line in stream:
+            run = worker.run
+            index = line.find(worker.token)
+            if index < 0:
+                if run is not None:
+                    self.events.put((run, stream_name, line))
+                continue
+            if index and run is not None:  # The run's last line had no newline
+                self.events.put((run, stream_name, line[:index]))
+            fields = line[index + len(worker.token):].split()
+            if fields == ["ready"]:
+                self.events.put((None, "ready", worker))
+                continue
+            if run is None:
+                continue
+            ended = run
+            if stream_name == "stderr":
+                exit_code, cpu_seconds, peak_memory, retire = fields
+                worker.retire = retire == "1"
+                self.events.put((run, None, (time.monotonic() - run.started, int(exit_code), float(cpu_seconds),
+                                             int(peak_memory) or None)))
+            self.events.put((run, stream_name, None))
+        stream.close()
+        run = worker.run
+        if run is not None and run is not ended:  # The worker died during the run
+            self.events.put((run, stream_name, None))
+    
+    def _wait_process(self, worker):
+        self.events.put((None, "exited", (worker, wait_for_process(worker.process))))
+    
+    def handle_event(self, kind, payload):
+        if kind == "ready":
+            payload.ready = True
+            return
+        worker, usage = payload
+        if worker in self.workers:
+            self.workers.remove(worker)
+        if not worker.ready:  # It could not even start; stop warming rather than retry forever
+            self.environments.discard(worker.environment)
+        run = worker.run
+        if run is not None and run.wall_seconds is None:  # Killed, or crashed without reporting
+            run.wall_seconds = time.monotonic() - run.started
+            run.returncode, run.cpu_seconds, run.peak_memory = usage
+        worker.jobs.close()
+    
+    def release(self):
+        """Return workers whose run has been fully collected to the idle set, and replace retired ones."""
+        for worker in list(self.workers):
+            run = worker.run
+            if run is None or run.wall_seconds is None or run.open_streams > 0:
+                continue
+            worker.run = None
+            if worker.retire:
+                self.workers.remove(worker)  # It exits by itself; handle_event() closes its pipe
+        self.top_up()
+    
+    def shutdown(self):
+        """Let idle workers exit by closing their job pipes; busy workers have been killed by the runner."""
+        self.environments.clear()
+        for worker in self.workers:
+            if worker.run is None:
+                worker.jobs.close()
+        self.workers.clear()
+
+class SubappRunner:
+    """
+    Runs sub-applications in separate Python processes, at most max_workers at a time.
+    Output and exit status are collected by background threads and handed over through a queue; the
+    owner calls poll() periodically (from the Tk event loop) to collect them, start queued runs and
+    enforce timeouts. Every finished run is recorded in the optional RunHistory. With warm_pool
+    settings ({"workers", "preload", "max_runs", "max_memory_mb"}) runs are handed to a WarmPool
+    worker when one is idle, and to a fresh process otherwise.
+    """
+    
+    def __init__(self, max_workers=4, timeout=None, on_output=None, on_status=None, history=None, warm_pool=None):
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.on_output = on_output  # callback(run, stream, text)
+        self.on_status = on_status  # callback(run)
+        self.history = history
+        self.runs = OrderedDict()   # run_id -> SubappRun
+        import queue
+        self._pending = []
+        self._events = queue.Queue()
+        self._next_id = 1
+        self.warm_pool = WarmPool(self._events, **warm_pool) if warm_pool and warm_pool.get("workers") else None
+    
+    def submit(self, environment, name, path, timeout=None, code_path=None):
+        run = SubappRun(self._next_id, environment, name, path, timeout if timeout is not None else self.timeout,
+                        code_path=code_path)
+        self._next_id += 1
+        self.runs[run.run_id] = run
+        self._pending.append(run)
+        self._notify(run)
+        self._start_pending()
+        return run
+    
+    def cancel(self, run_id):
+        run = self.runs.get(run_id)
+        if run is None:
+            return
+        if run.status == "queued":
+            self._pending.remove(run)
+            self._finish(run, "cancelled")
+        elif run.status == "running":
+            run.status = "cancelled"
+            run.process.kill()
+    
+    def warm(self, environment):
+        """Start pre-warming interpreters for an environment, if a warm pool is configured."""
+        if self.warm_pool is not None:
+            self.warm_pool.warm(environment)
+    
+    def active(self):
+        return [run for run in self.runs.values() if run.ended is None]
+    
+    def shutdown(self):
+        for run in self.active():
+            self.cancel(run.run_id)
+        if self.warm_pool is not None:
+            self.warm_pool.shutdown()
+    
+    def _notify(self, run):
+        if self.on_status:
+            self.on_status(run)
+    
+    def _command(self, run):
+        if run.code_path:
+            return [sys.executable, "-u", "-c", RUN_BOOTSTRAP, run.code_path, run.path]
+        return [sys.executable, "-u", run.path]
+    
+    def _start_pending(self):
+        import subprocess
+        import threading
+        running = sum(1 for run in self.runs.values() if run.status == "running")
+        while self._pending and running < self.max_workers:
+            run = self._pending.pop(0)
+            worker = self.warm_pool.take(run.environment) if self.warm_pool is not None else None
+            if worker is not None:
+                try:
+                    run.started = time.monotonic()
+                    run.process = worker.process
+                    worker.dispatch(run)
+                except OSError:  # The worker just died; its exit event is still handled by the pool
+                    self.warm_pool.workers.remove(worker)
+                    worker.run = run.process = None
+                    worker = None
+            if worker is not None:
+                run.status = "running"
+                run.open_streams = 2
+                running += 1
+                self._notify(run)
+                continue
+            try:
+                run.process = subprocess.Popen(self._command(run), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                               text=True, errors="replace", bufsize=1)
+            except OSError as e:
+                run.output.append(("stderr", f"Could not start: {e}\n"))
+                self._finish(run, "failed")
+                continue
+            run.status = "running"
+            run.started = time.monotonic()
+            run.open_streams = 2
+            for stream_name, stream in (("stdout", run.process.stdout), ("stderr", run.process.stderr)):
+                threading.Thread(target=self._read_stream, args=(run, stream_name, stream), daemon=True).start()
+            threading.Thread(target=self._wait_process, args=(run,), daemon=True).start()
+            running += 1
+            self._notify(run)
+    
+    def _read_stream(self, run, stream_name, stream):
+        for line in stream:
+            self._events.put((run, stream_name, line))
+        stream.close()
+        self._events.put((run, stream_name, None))
+    
+    def _wait_process(self, run):
+        usage = wait_for_process(run.process)
+        self._events.put((run, None, (time.monotonic() - run.started,) + usage))
+    
+    def _finish(self, run, status):
+        run.status = status
+        run.ended = time.monotonic()
+        if self.history is not None:
+            try:
+                self.history.record(run)
+            except OSError:
+                pass  # Losing a history line must not lose the run
+        self._notify(run)
+    
+    def poll(self, max_events=500):
+        """Deliver pending output, enforce timeouts and reap finished runs. Never blocks."""
+        for _ in range(max_events):
+            if self._events.empty():  # Only this thread consumes, so get_nowait cannot fail after this
+                break
+            run, stream_name, text = self._events.get_nowait()
+            if run is None:  # A warm worker became ready or exited
+                self.warm_pool.handle_event(stream_name, text)
+                continue
+            if stream_name is None:  # The process exited
+                run.wall_seconds, run.returncode, run.cpu_seconds, run.peak_memory = text
+                continue
+            if text is None:
+                run.open_streams -= 1
+                continue
+            run.output.append((stream_name, text))
+            if self.on_output:
+                self.on_output(run, stream_name, text)
+        
+        now = time.monotonic()
+        for run in list(self.runs.values()):
+            if run.process is None or run.ended is not None:
+                continue
+            if run.status == "running" and run.timeout and now - run.started > run.timeout:
+                run.status = "timed out"
+                run.process.kill()
+            if run.wall_seconds is None or run.open_streams > 0:
+                continue
+            if run.status == "running":
+                self._finish(run, "finished" if run.returncode == 0 else "failed")
+            else:
+                self._finish(run, run.status)  # cancelled or timed out
+        if self.warm_pool is not None:
+            self.warm_pool.release()
+        self._start_pending()
+
+def load_config(path=CONFIG_FILE):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {}
+
+class CampfireEngine:
+    """
+    Environment, promotion and run logic shared by the Tk launcher and the command line.
+    All paths are relative to the current directory, which holds DEV, TEST and PROD.
+    Operations may run on a background thread while the Tk thread lists sub-applications; the stores
+    and catalogs they share lock themselves.
+    """
+    
+    def __init__(self, user_role=None, config=None):
+        import threading
+        self._lock = threading.RLock()  # Guards lazy creation of catalogs and stores
+        self.user_role = user_role  # Recorded in provenance; falls back to the OS user name
+        self.config = load_config() if config is None else config
+        
+        # One persistent sub-application catalog and push history per environment directory,
+        # created on first use (which is also when the directory is checked for).
+        self.catalogs = {}
+        self.provenance = {}
+        self.search_indexes = {}  # Built on first search
+        
+        # Promoted sub-applications live in a content-addressed store; compiled code is cached.
+        self.blob_store = BlobStore()
+        self.bytecode_cache = BytecodeCache()
+        self.run_history = RunHistory()
+        
+        # Shared TEST -> PROD push request queue, opened on first use.
+        self._push_requests = None
+    
+    @property
+    def push_requests(self):
+        with self._lock:
+            if self._push_requests is None:
+                self._push_requests = PushRequestStore(claim_lease=self.config.get("approval_lease_seconds", 3600))
+            return self._push_requests
+    
+    def preload(self):
+        """Open every store and refresh every catalog now instead of on first use."""
+        for directory in ENVIRONMENTS:
+            self.get_catalog(directory).refresh()
+        self.push_requests
+    
+    def actor(self):
+        """Name recorded for pushes and approvals."""
+        if self.user_role:
+            return self.user_role.replace('_', ' ').title()
+        import getpass
+        return getpass.getuser()
+    
+    def get_catalog(self, directory):
+        with self._lock:
+            if directory not in self.catalogs:
+                os.makedirs(directory, exist_ok=True)  # Checked once per environment per process
+                self.catalogs[directory] = SubappCatalog(directory, hash_workers=self.config.get("hash_workers", 8))
+            return self.catalogs[directory]
+    
+    def get_provenance(self, directory):
+        with self._lock:
+            if directory not in self.provenance:
+                self.provenance[directory] = ProvenanceStore(directory)
+            return self.provenance[directory]
+    
+    def search_index(self, environment):
+        """The environment's SubappSearchIndex, synced with its catalog and push history."""
+        entries = self.get_catalog(environment).snapshot()
+        provenance = self.get_provenance(environment)
+        with self._lock:
+            index = self.search_indexes.get(environment)
+            if index is None:
+                index = self.search_indexes[environment] = SubappSearchIndex()
+        index.sync(entries, provenance.snapshot())  # Outside the engine lock: a first build can take seconds
+        return index
+    
+    def list_subapplications(self, environment):
+        return self.get_catalog(environment).names()
+    
+    def subapp_path(self, environment, subapp_name):
+        """Path of a sub-application: its script, its zipapp or its package directory."""
+        catalog = self.get_catalog(environment)
+        entry = catalog.get(subapp_name)
+        return catalog.location(subapp_name, subapp_kind(entry) if entry else "script")
+    
+    def promote(self, subapp_names, source_env, target_env, move=False, progress=None):
+        """
+        Promote a batch of sub-applications between environments through the blob store.
+        Only files whose hash differs from the target's copy are staged, so re-pushing a package
+        after a small change links just the changed files; files the source no longer has are
+        removed, along with directories that leaves empty. Blobs and target links are staged in
+        parallel first and only renamed into place once all of them succeeded, so a failure leaves
+        the target untouched. Catalogs, provenance and the bytecode cache are then updated with one
+        write each; pushes are recorded as provenance rather than as headers in the source.
+        progress(done, total) is called on the calling thread as each sub-application is staged.
+        Returns {name: content hash}.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        import datetime
+        source_catalog = self.get_catalog(source_env)
+        target_catalog = self.get_catalog(target_env)
+        entries = source_catalog.refresh_entries(subapp_names)
+        missing = [name for name, entry in entries.items() if entry is None]
+        if missing:
+            raise FileNotFoundError(f"Not found in {source_env}: {', '.join(missing)}")
+        targets = target_catalog.refresh_entries(subapp_names)  # What the target holds now, for the delta
+        
+        def stage(name):
+            """Stage one sub-application; returns (name, hash, [(tmp path, target path)], [stale paths])."""
+            entry, target = entries[name], targets[name]
+            kind = subapp_kind(entry)
+            source_path = source_catalog.location(name, kind)
+            target_path = target_catalog.location(name, kind)
+            same_kind = target is not None and subapp_kind(target) == kind
+            stale = [] if target is None or same_kind else [target_catalog.location(name, subapp_kind(target))]
+            if kind == "package":
+                target_files = target["files"] if same_kind else {}
+                changed = [(os.path.join(source_path, *rel_path.split("/")),
+                            os.path.join(target_path, *rel_path.split("/")), f["hash"])
+                           for rel_path, f in entry["files"].items()
+                           if target_files.get(rel_path, {}).get("hash") != f["hash"]]
+                stale += [os.path.join(target_path, *rel_path.split("/"))
+                          for rel_path in target_files if rel_path not in entry["files"]]
+            elif same_kind and target["hash"] == entry["hash"]:
+                changed = []
+            else:
+                changed = [(source_path, target_path, entry["hash"])]
+            
+            recorded_hash = entry["hash"]
+            links = []
+            try:
+                for source_file, target_file, known_hash in changed:
+                    if self.blob_store.has(known_hash):
+                        content_hash = known_hash
+                    else:
+                        content_hash = self.blob_store.put_file(source_file)
+                    if kind != "package":
+                        recorded_hash = content_hash  # What was actually copied, in case the file just changed
+                    os.makedirs(os.path.dirname(target_file), exist_ok=True)
+                    links.append((self.blob_store.stage_link(content_hash, target_file), target_file))
+            except OSError:
+                for tmp_path, _ in links:
+                    remove_path(tmp_path)
+                raise
+            return name, recorded_hash, links, stale
+        
+        staged, errors = [], []
+        with ThreadPoolExecutor(max_workers=self.config.get("copy_workers", 8)) as pool:
+            for done, future in enumerate([pool.submit(stage, name) for name in subapp_names], 1):
+                try:
+                    staged.append(future.result())
+                except OSError as e:
+                    errors.append(e)
+                if progress:
+                    progress(done, len(subapp_names))
+        if errors:
+            for _, _, links, _ in staged:
+                for tmp_path, _ in links:
+                    remove_path(tmp_path)
+            raise errors[0]
+        
+        hashes = {}
+        for name, content_hash, links, stale in staged:
+            for tmp_path, target_file in links:
+                replace_file(tmp_path, target_file)
+            for path in stale:
+                remove_path(path)
+                remove_empty_parents(path, target_catalog.location(name, "package"))
+            hashes[name] = content_hash
+        
+        pushed_at = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        pushed_by = self.actor()
+        source_provenance = self.get_provenance(source_env)
+        self.get_provenance(target_env).record_many({
+            name: ({"hash": content_hash, "pushed_at": pushed_at, "pushed_by": pushed_by,
+                    "route": f"{source_env} -> {target_env}"}, source_provenance.history(name))
+            for name, content_hash in hashes.items()
+        })
+        target_catalog.update_entries(hashes, sources=entries)
+        self.bytecode_cache.invalidate_many(target_env, hashes)
+        
+        # Blobs the replaced target files (and moved source files) were linked to may now be unused.
+        released = set().union(*(entry_hashes(targets[name]) for name in hashes if targets[name] is not None))
+        if move:
+            for name in hashes:
+                remove_path(source_catalog.location(name, subapp_kind(entries[name])))
+                released |= entry_hashes(entries[name])
+            source_catalog.remove_entries(hashes)
+            source_provenance.forget_many(hashes)
+            self.bytecode_cache.invalidate_many(source_env, hashes)
+        self.blob_store.release(released)
+        self.blob_store.save()
+        return hashes
+    
+    def drift(self, environments=ENVIRONMENTS):
+        """
+        Compare every sub-application across environments by normalized content hash, so copies
+        that differ only by push headers are the same. Returns {name: {environment: hash, or None
+        where it is missing}} sorted by name. The environments are checked in parallel, and hashes
+        are cached in the catalogs by stat, so a warm check only stats the files.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        catalogs = [self.get_catalog(environment) for environment in environments]
+        with ThreadPoolExecutor(max_workers=len(catalogs)) as pool:
+            hashes = list(pool.map(SubappCatalog.normalized_hashes, catalogs))
+        return {name: {environment: found.get(name) for environment, found in zip(environments, hashes)}
+                for name in sorted(set().union(*hashes))}
+    
+    def request_push(self, subapp_names):
+        """Queue TEST -> PROD push requests; returns the names that were not already pending."""
+        return self.push_requests.add_many(subapp_names, self.actor())
+    
+    def approve(self, subapp_names, progress=None):
+        """
+        Approve pending push requests as one batch, moving the sub-applications from TEST to PROD.
+        Returns (approved, rejected): the names approved by this call, and those rejected because
+        the sub-application is no longer in TEST. Requests another user already claimed are skipped.
+        """
+        claimed = self.push_requests.claim(subapp_names, self.actor())
+        entries = self.get_catalog("TEST").refresh_entries(claimed)
+        rejected = [name for name in claimed if entries[name] is None]
+        if rejected:
+            self.push_requests.release(rejected)
+            self.push_requests.reject(rejected, self.actor())
+            claimed = [name for name in claimed if entries[name] is not None]
+        if claimed:
+            try:
+                self.promote(claimed, "TEST", "PROD", move=True, progress=progress)
+            except BaseException:
+                self.push_requests.release(claimed)
+                raise
+            self.push_requests.complete(claimed)
+        return claimed, rejected
+    
+    def reject(self, subapp_names):
+        """Reject pending push requests; returns the names rejected."""
+        return self.push_requests.reject(subapp_names, self.actor())
+    
+    def remove(self, environment, subapp_names, progress=None):
+        """
+        Remove sub-applications from an environment, updating its catalog and provenance once and
+        deleting the blobs nothing links to any more. Removing from TEST withdraws pending push requests.
+        """
+        catalog = self.get_catalog(environment)
+        entries = catalog.refresh_entries(subapp_names)
+        missing = [name for name, entry in entries.items() if entry is None]
+        if missing:
+            raise FileNotFoundError(f"Not found in {environment}: {', '.join(missing)}")
+        for done, name in enumerate(subapp_names, 1):
+            remove_path(catalog.location(name, subapp_kind(entries[name])))
+            if progress:
+                progress(done, len(subapp_names))
+        self.blob_store.release(set().union(*(entry_hashes(entries[name]) for name in subapp_names)))
+        self.blob_store.save()
+        catalog.remove_entries(subapp_names)
+        self.get_provenance(environment).forget_many(subapp_names)
+        self.bytecode_cache.invalidate_many(environment, subapp_names)
+        if environment == "TEST":
+            self.push_requests.withdraw(subapp_names)
+    
+    def prepare_run(self, environment, subapp_name):
+        """
+        Return (script path, cached code path or None) for a run; raises FileNotFoundError if missing.
+        A package runs its manifest's entry script; a zipapp is handed to Python as it is.
+        """
+        catalog = self.get_catalog(environment)
+        entry = catalog.refresh_entry(subapp_name)
+        if entry is None:
+            raise FileNotFoundError(f"'{subapp_name}' not found in {environment}.")
+        kind = subapp_kind(entry)
+        subapp_path = catalog.location(subapp_name, kind)
+        if kind == "zipapp":
+            return subapp_path, None
+        content_hash = entry["hash"]
+        if kind == "package":
+            if entry["entry"] not in entry["files"]:
+                raise FileNotFoundError(f"'{subapp_name}' has no entry script {entry['entry']}.")
+            content_hash = entry["files"][entry["entry"]]["hash"]
+            subapp_path = os.path.join(subapp_path, *entry["entry"].split("/"))
+        return subapp_path, self.bytecode_cache.get(environment, subapp_name, subapp_path, content_hash)
+    
+    def create_runner(self, on_output=None, on_status=None, warm=False):
+        """A SubappRunner; warm=True uses the configured warm_pool, worth it for a long-lived launcher."""
+        return SubappRunner(max_workers=self.config.get("max_concurrent_runs", 4),
+                            timeout=self.config.get("run_timeout_seconds"),
+                            on_output=on_output, on_status=on_status, history=self.run_history,
+                            warm_pool=self.config.get("warm_pool") if warm else None)
@@ -0,0 +1,267 @@
+"""
+Regression tests for the headless engine in campfire_core: promotion through the blob store, the
+shared push request queue, the bytecode cache and the sub-application search index. Engine tests
+work in a fresh temporary directory holding DEV, TEST and PROD.
+
+    python -m unittest test_campfire_core
+"""
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import campfire_core
+from campfire_core import CampfireEngine
+
+class EngineTestCase(unittest.TestCase):
+    """Runs each test in an empty directory, as if Campfire had been started there."""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="campfire-test-")
+        self.addCleanup(shutil.rmtree, self.workdir)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.workdir)
+        self.engine = CampfireEngine(config={})
+
+    def write(self, path, text):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def read(self, path):
+        with open(path, 'r') as f:
+            return f.read()
+
+    def write_package(self, directory, files):
+        self.write(os.path.join(directory, campfire_core.SUBAPP_MANIFEST), "{}")
+        for rel_path, text in files.items():
+            self.write(os.path.join(directory, *rel_path.split("/")), text)
+
+    def tree(self, directory):
+        """Every file and directory under directory, as sorted relative paths with '/' separators."""
+        paths = []
+        for root, dirs, files in os.walk(directory):
+            for name in dirs + files:
+                paths.append(os.path.relpath(os.path.join(root, name), directory).replace(os.sep, "/"))
+        return sorted(paths)
+
+class PromoteTest(EngineTestCase):
+
+    def test_repush_relinks_only_changed_files(self):
+        self.write_package("DEV/Pkg", {"__main__.py": "print(1)\n", "lib/a.py": "a = 1\n", "lib/b.py": "b = 1\n"})
+        self.engine.promote(["Pkg"], "DEV", "TEST")
+        before = {name: os.stat(f"TEST/Pkg/{name}").st_ino for name in ("__main__.py", "lib/a.py", "lib/b.py")}
+        self.write("DEV/Pkg/lib/a.py", "a = 2\n")
+        blob_store = self.engine.blob_store
+        with mock.patch.object(blob_store, "stage_link", wraps=blob_store.stage_link) as stage_link:
+            self.engine.promote(["Pkg"], "DEV", "TEST")
+        self.assertEqual([call.args[1] for call in stage_link.call_args_list],
+                         [os.path.join("TEST", "Pkg", "lib", "a.py")])
+        self.assertEqual(self.read("TEST/Pkg/lib/a.py"), "a = 2\n")
+        self.assertNotEqual(os.stat("TEST/Pkg/lib/a.py").st_ino, before["lib/a.py"])
+        self.assertEqual(os.stat("TEST/Pkg/lib/b.py").st_ino, before["lib/b.py"])
+        self.assertEqual(os.stat("TEST/Pkg/__main__.py").st_ino, before["__main__.py"])
+
+    def test_removed_files_and_emptied_directories_are_pruned(self):
+        self.write_package("DEV/Pkg", {"__main__.py": "print(1)\n", "lib/a.py": "a = 1\n", "lib/deep/er/c.py": "c = 1\n"})
+        self.engine.promote(["Pkg"], "DEV", "TEST")
+        shutil.rmtree("DEV/Pkg/lib/deep")
+        self.engine.promote(["Pkg"], "DEV", "TEST")
+        self.assertEqual(self.tree("TEST/Pkg"), ["__main__.py", "campfire.json", "lib", "lib/a.py"])
+        self.assertEqual(sorted(self.engine.get_catalog("TEST").get("Pkg")["files"]),
+                         ["__main__.py", "campfire.json", "lib/a.py"])
+
+    def test_script_replaced_by_package(self):
+        self.write("DEV/x.py", "print('script')\n")
+        self.engine.promote(["x"], "DEV", "TEST")
+        os.remove("DEV/x.py")
+        self.write_package("DEV/x", {"__main__.py": "print('package')\n"})
+        self.engine.promote(["x"], "DEV", "TEST")
+        self.assertFalse(os.path.exists("TEST/x.py"))
+        self.assertEqual(self.read("TEST/x/__main__.py"), "print('package')\n")
+        self.assertEqual(campfire_core.subapp_kind(self.engine.get_catalog("TEST").get("x")), "package")
+
+    def test_failed_stage_leaves_target_untouched(self):
+        self.write_package("DEV/Pkg", {"__main__.py": "print(1)\n", "a.py": "a = 1\n", "b.py": "b = 1\n"})
+        self.write("DEV/Solo.py", "print('solo 1')\n")
+        self.engine.promote(["Pkg", "Solo"], "DEV", "TEST")
+        before = {path: self.read(os.path.join("TEST", path)) for path in ("Pkg/a.py", "Pkg/b.py", "Solo.py")}
+        self.write("DEV/Pkg/a.py", "a = 2\n")
+        self.write("DEV/Pkg/b.py", "b = 2\n")
+        self.write("DEV/Solo.py", "print('solo 2')\n")
+        put_file = self.engine.blob_store.put_file
+
+        def failing_put_file(source_path):
+            if source_path.endswith("b.py"):
+                raise OSError("disk full")
+            return put_file(source_path)
+
+        with mock.patch.object(self.engine.blob_store, "put_file", side_effect=failing_put_file):
+            with self.assertRaises(OSError):
+                self.engine.promote(["Pkg", "Solo"], "DEV", "TEST")
+        self.assertEqual({path: self.read(os.path.join("TEST", path)) for path in before}, before)
+        self.assertEqual(self.tree("TEST"),
+                         ["Pkg", "Pkg/__main__.py", "Pkg/a.py", "Pkg/b.py", "Pkg/campfire.json", "Solo.py"])
+        self.assertEqual(len(self.engine.get_provenance("TEST").history("Solo")), 1)
+
+class PushRequestStoreTest(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.store = self.engine.push_requests
+        self.addCleanup(self.store.conn.close)
+
+    def age(self, column, seconds):
+        """Move a timestamp of every row back by seconds, as if that much time had passed."""
+        self.store.conn.execute(f"UPDATE push_requests SET {column} = {column} - ?", (seconds,))
+
+    def test_duplicate_add(self):
+        self.assertTrue(self.store.add("Hello", "alice"))
+        self.assertFalse(self.store.add("Hello", "bob"))
+        self.assertEqual(self.store.add_many(["Hello", "Other"], "bob"), ["Other"])
+        self.assertEqual([(name, by) for name, _, by in self.store.pending()], [("Hello", "alice"), ("Other", "bob")])
+
+    def test_only_one_claimant_wins(self):
+        self.store.add_many(["A", "B"], "alice")
+        other = campfire_core.PushRequestStore()  # Another launcher on the same database
+        self.addCleanup(other.conn.close)
+        self.assertEqual(self.store.claim(["A"], "manager 1"), ["A"])
+        self.assertEqual(other.claim(["A", "B"], "manager 2"), ["B"])
+        self.assertEqual(self.store.claim(["A", "B"], "manager 1"), [])
+        self.assertEqual(self.store.pending_names(), [])
+        self.assertFalse(self.store.add("A", "alice"))  # Still being approved
+
+    def test_expired_claim_is_pending_again(self):
+        self.store.add_many(["A"], "alice")
+        self.assertEqual(self.store.claim(["A"], "crashed manager"), ["A"])
+        self.assertEqual(self.store.pending_names(), [])
+        self.age("decided_at", self.store.claim_lease + 1)
+        self.assertEqual(self.store.pending_names(), ["A"])
+        self.assertEqual(self.store.claim(["A"], "manager 2"), ["A"])
+        self.assertEqual(self.store.pending_names(), [])
+        self.age("decided_at", self.store.claim_lease + 1)
+        self.assertEqual(self.store.add_many(["A"], "bob"), ["A"])
+        self.assertEqual([(name, by) for name, _, by in self.store.pending()], [("A", "bob")])
+
+    def test_failed_approval_releases_claim(self):
+        self.write("DEV/Hello.py", "print('hello')\n")
+        self.engine.promote(["Hello"], "DEV", "TEST")
+        self.engine.request_push(["Hello"])
+        with mock.patch.object(self.engine, "promote", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.engine.approve(["Hello"])
+        self.assertEqual(self.store.pending_names(), ["Hello"])
+        self.assertEqual(self.engine.approve(["Hello"]), (["Hello"], []))
+        self.assertEqual(self.store.pending_names(), [])
+        self.assertTrue(os.path.exists("PROD/Hello.py"))
+
+    def test_pending_since(self):
+        self.store.add_many(["Old"], "alice")
+        self.age("requested_at", 600)
+        self.store.add_many(["New"], "bob")
+        cutoff = time.time() - 300
+        self.assertEqual([name for name, _, _ in self.store.pending(since=cutoff)], ["New"])
+        self.assertEqual([name for name, _, _ in self.store.pending()], ["Old", "New"])
+
+class BytecodeCacheTest(EngineTestCase):
+
+    def test_edits_leave_one_code_file(self):
+        for version in range(3):
+            self.write("DEV/Hello.py", f"print({'v' * (version + 1)!r})\n")  # A new size, whatever the mtime resolution
+            script_path, code_path = self.engine.prepare_run("DEV", "Hello")
+            self.assertTrue(os.path.exists(code_path))
+            self.assertEqual(os.listdir(os.path.dirname(code_path)), [os.path.basename(code_path)])
+        self.assertEqual(self.engine.prepare_run("DEV", "Hello"), (script_path, code_path))
+        self.engine.remove("DEV", ["Hello"])
+        self.assertEqual(os.listdir(os.path.dirname(code_path)), [])
+
+def expected_search(entries, provenance, query):
+    """What SubappSearchIndex.search should return, by scanning every entry's text."""
+    terms = [term for term in query.lower().split() if len(term) >= 3 or re.fullmatch(r"\w+", term)]
+
+    def matches(text):
+        words = re.findall(r"\w+", text)
+        return all(term in text if len(term) >= 3 else any(word.startswith(term) for word in words)
+                   for term in terms)
+
+    found = []
+    for name, entry in entries.items():
+        history = provenance.get(name)
+        text = campfire_core.SubappSearchIndex._text(name, entry, history[0] if history else None)
+        if matches(text):
+            found.append((not matches(name.lower()), name))
+    return [name for _, name in sorted(found)]
+
+class SubappSearchIndexTest(unittest.TestCase):
+
+    def check(self, index, entries, provenance, queries):
+        for query in queries:
+            with self.subTest(query=query):
+                self.assertEqual(index.search(query), expected_search(entries, provenance, query))
+
+    def test_short_terms_match_word_starts_and_long_terms_match_anywhere(self):
+        entries = {"Alpha": {"doc": "reads csv files"}, "Beta": {"doc": "a macro tool"}, "Crab": {"doc": ""}}
+        index = campfire_core.SubappSearchIndex()
+        index.sync(entries)
+        self.assertEqual(index.search("cr"), ["Crab"])          # Not "macro": two letters match word starts
+        self.assertEqual(index.search("cro"), ["Beta"])         # Three letters match anywhere
+        self.assertEqual(index.search("acro"), ["Beta"])
+        self.assertEqual(index.search("CSV files"), ["Alpha"])
+        self.assertEqual(index.search("csv tool"), [])
+        self.assertEqual(index.search(""), ["Alpha", "Beta", "Crab"])
+        self.assertEqual(index.search("- ,"), ["Alpha", "Beta", "Crab"])  # Short non-word terms are ignored
+
+    def test_name_matches_come_first(self):
+        entries = {"Abc": {"doc": "report"}, "Report": {"doc": ""}, "Zreport": {"doc": ""}, "Xyz": {"doc": "report tool"}}
+        provenance = {"Abc": [{"pushed_by": "reporter", "route": "DEV -> TEST", "pushed_at": "2024-01-01"}]}
+        index = campfire_core.SubappSearchIndex()
+        index.sync(entries, provenance)
+        self.assertEqual(index.search("report"), ["Report", "Zreport", "Abc", "Xyz"])
+        self.assertEqual(index.search("re"), ["Report", "Abc", "Xyz"])  # Zreport has no word starting "re"
+        self.assertEqual(index.search("reporter"), ["Abc"])
+        # Every trigram of "abcd" is in the name "Abcxbcd", but only its docstring contains "abcd".
+        entries = {"Abcxbcd": {"doc": "abcd"}, "Zabcd": {"doc": ""}}
+        index.sync(entries)
+        self.assertEqual(index.search("abcd"), ["Zabcd", "Abcxbcd"])
+
+    def test_incremental_syncs_match_a_full_scan(self):
+        rng = random.Random(1234)
+        syllables = ["ab", "ba", "cab", "csv", "glim", "re", "port", "x", "yz", "to", "ol"]
+
+        def word():
+            return "".join(rng.choice(syllables) for _ in range(rng.randint(1, 3)))
+
+        def new_entry():
+            return {"doc": " ".join(word() for _ in range(rng.randint(0, 4))),
+                    "pushes": [f"#Last push initiated by {word()}"] if rng.random() < 0.2 else []}
+
+        entries, provenance = {}, {}
+        while len(entries) < 300:
+            entries[word().title() + str(rng.randint(0, 99))] = new_entry()
+        index = campfire_core.SubappSearchIndex()
+        queries = ["", "ab", "c", "csv", "glim port", "ab re", "abc", "cabcsv", "portre", "zzz", "Re To", "x yz"]
+        queries += [" ".join(word()[:rng.randint(1, 6)] for _ in range(rng.randint(1, 2))) for _ in range(30)]
+        for round in range(40):
+            for _ in range(rng.randint(0, 6)):
+                action = rng.random()
+                name = rng.choice(sorted(entries))
+                if action < 0.3:
+                    del entries[name]
+                    provenance.pop(name, None)
+                elif action < 0.6:
+                    entries[word().title() + str(rng.randint(0, 99))] = new_entry()
+                elif action < 0.8:
+                    entries[name] = new_entry()  # Catalogs hand over a new dict when an entry changed
+                else:
+                    provenance[name] = [{"pushed_by": word(), "route": "DEV -> TEST", "pushed_at": str(round)}]
+            index.sync(entries, provenance)
+            with self.subTest(round=round):
+                self.assertEqual(len(index), len(entries))
+                self.check(index, entries, provenance, queries)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+"""
+Regression tests for GLIM-CSV's block conversion: the output must stay byte-identical to the original
+row-by-row converters, whatever the block size and whether or not the blocks go to worker processes.
+Batch runs with --check hash must not remember the hash of a file they failed to convert.
+
+    python -m unittest test_glim_csv
+"""
+import csv
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Inputs csv.reader handles in ways a simple quote count does not: literal quotes inside unquoted
+# fields, quoted fields spanning lines, escaped and trailing quotes, blank lines, and a missing
+# final newline.
+CSV_CASES = {
+    "stray quotes": '1,12" pipe,3\n2,"multi\nline, field",x\n3,plain,y\n4,"another\nfield",z\n',
+    "stray quote then long field": '1,a"b,c\n' + ''.join(f'{i},"line {i}\n\n,more",{i}\n' for i in range(50)),
+    "escaped quotes": '1,"say ""hi""",2\n2,"""",""\n3,"a""b"c,d""e\n',
+    "quote after closing quote": '1,"a"b,c\n2,"x" "y",z\n',
+    "blank lines": '1,2\n\n\n3,4\n',
+    "no final newline": '1,"a\nb",2\n3,4',
+    "crlf": '1,"a\r\nb",2\r\n3,4\r\n',
+    "unclosed quote": '1,2\n3,"never closed\n4,5\n',
+    "no quotes": 'a,b,c\n1,2,3\n',
+}
+GLIM_CASES = {
+    "plain": 'a b c\n1 2 3\n',
+    "needs quoting": 'a,b c\nsaid "hi" x\n\n  padded  line  \n',
+    "no final newline": 'a b\nc,d',
+}
+BLOCK_SIZES = [1, 7, 64, 4096]
+
+def old_csv_to_glim(csv_file, glim_file):
+    """The converter as it was before block conversion."""
+    with open(csv_file, mode='r') as infile, open(glim_file, mode='w') as outfile:
+        for row in csv.reader(infile):
+            outfile.write(' '.join(row) + '\n')
+
+def old_glim_to_csv(glim_file, csv_file):
+    with open(glim_file, mode='r') as infile, open(csv_file, mode='w', newline='') as outfile:
+        writer = csv.writer(outfile)
+        for line in infile:
+            writer.writerow(line.strip().split(' '))
+
+def load_glim_csv(environment):
+    """Import <environment>/GLIM-CSV.py, registered in sys.modules so its process pools can pickle."""
+    name = f"glim_csv_{environment.lower()}"
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, environment, "GLIM-CSV.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+class ByteIdenticalTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.modules = {environment: load_glim_csv(environment) for environment in ("DEV", "PROD")}
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="glim-csv-test-")
+        self.addCleanup(shutil.rmtree, self.workdir)
+
+    def path(self, name):
+        return os.path.join(self.workdir, name)
+
+    def write(self, name, text):
+        with open(self.path(name), 'w', newline='') as f:
+            f.write(text)
+        return self.path(name)
+
+    def read(self, name):
+        with open(self.path(name), 'rb') as f:
+            return f.read()
+
+    def check(self, convert, old_convert, text, in_name, out_name, **options):
+        in_path = self.write(in_name, text)
+        old_convert(in_path, self.path("expected"))
+        convert(in_path, self.path(out_name), **options)
+        self.assertEqual(self.read(out_name), self.read("expected"))
+
+    def test_csv_to_glim(self):
+        for environment, module in self.modules.items():
+            for case, text in CSV_CASES.items():
+                for block_size in BLOCK_SIZES:
+                    with self.subTest(environment=environment, case=case, block_size=block_size):
+                        self.check(module.csv_to_glim, old_csv_to_glim, text, "in.csv", "out.glim",
+                                   block_size=block_size, workers=1)
+
+    def test_csv_to_glim_parallel(self):
+        module = self.modules["DEV"]
+        for case, text in CSV_CASES.items():
+            for block_size in (7, 64):
+                with self.subTest(case=case, block_size=block_size):
+                    self.check(module.csv_to_glim, old_csv_to_glim, text, "in.csv", "out.glim",
+                               block_size=block_size, workers=2, parallel_threshold=0)
+
+    def test_glim_to_csv(self):
+        for environment, module in self.modules.items():
+            for case, text in GLIM_CASES.items():
+                for block_size in BLOCK_SIZES:
+                    with self.subTest(environment=environment, case=case, block_size=block_size):
+                        self.check(module.glim_to_csv, old_glim_to_csv, text, "in.glim", "out.csv",
+                                   block_size=block_size, workers=1)
+
+    def test_ends_in_quotes(self):
+        ends_in_quotes = self.modules["DEV"].ends_in_quotes
+        self.assertFalse(ends_in_quotes('1,12" pipe,3\n'))
+        self.assertTrue(ends_in_quotes('1,"multi\n'))
+        self.assertTrue(ends_in_quotes('1,"a""\n'))
+        self.assertFalse(ends_in_quotes('1,"a"""\n'))
+        self.assertFalse(ends_in_quotes('line, field",x\n', in_quotes=True))
+        self.assertTrue(ends_in_quotes('still "" inside\n', in_quotes=True))
+        self.assertTrue(ends_in_quotes('end",x,"next\n', in_quotes=True))
+
+class BatchHashCheckTest(unittest.TestCase):
+
+    def setUp(self):
+        self.module = load_glim_csv("DEV")
+        self.workdir = tempfile.mkdtemp(prefix="glim-csv-batch-test-")
+        self.addCleanup(shutil.rmtree, self.workdir)
+        self.source = os.path.join(self.workdir, "in")
+        self.output = os.path.join(self.workdir, "out")
+        os.makedirs(self.source)
+
+    def run_batch(self):
+        summary = self.module.convert_batch(self.source, "csv2glim", self.output, check="hash", workers=1)
+        return {os.path.basename(result["input"]): result["status"] for result in summary["files"]}
+
+    def test_failed_file_is_retried(self):
+        with open(os.path.join(self.source, "good.csv"), 'w') as f:
+            f.write("a,b\n")
+        # Not valid UTF-8, so the conversion fails after the input was hashed.
+        with open(os.path.join(self.source, "bad.csv"), 'wb') as f:
+            f.write(b"a,\xff\xfe\n")
+        self.assertEqual(self.run_batch(), {"good.csv": "converted", "bad.csv": "failed"})
+        self.assertEqual(self.run_batch(), {"good.csv": "skipped", "bad.csv": "failed"})
+        with open(os.path.join(self.output, self.module.BATCH_STATE_FILE), 'r') as f:
+            self.assertEqual(list(json.load(f)), ["good.glim"])
+
+if __name__ == "__main__":
+    unittest.main()